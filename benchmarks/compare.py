@@ -0,0 +1,94 @@
+"""
+    Compares two reports written by benchmarks.run, for example of the commits before and
+    after a change, and flags the metrics that got worse by more than the threshold.
+"""
+import argparse
+import json
+import sys
+
+# Options that change the numbers, reports should only be compared when they match.
+COMPARABLE_OPTIONS = ["concurrency", "duration", "warmup", "seed"]
+
+# (metric, whether a higher value is better)
+METRICS = [
+    ("throughput", True),
+    ("p50", False),
+    ("p99", False),
+]
+
+
+def get_metric(summary, metric):
+    if metric == "throughput":
+        return summary["throughput"]
+    return summary["latency_ms"][metric]
+
+
+def get_change(base, head):
+    if not base:
+        return None
+    return (head - base) / base * 100
+
+
+def compare(base_report, head_report, threshold):
+    """Returns the comparison rows and whether any metric regressed."""
+    rows = []
+    regressed = False
+
+    for name, head in head_report["scenarios"].items():
+        base = base_report["scenarios"].get(name)
+        if base is None:
+            continue
+        for metric, higher_is_better in METRICS:
+            (before, after) = (get_metric(base, metric), get_metric(head, metric))
+            change = get_change(before, after)
+            worse = (
+                change is not None
+                and (-change if higher_is_better else change) > threshold
+            )
+            regressed = regressed or worse
+            rows.append((name, metric, before, after, change, worse))
+
+    return (rows, regressed)
+
+
+def format_row(name, metric, before, after, change, worse):
+    change = "n/a" if change is None else f"{change:+.1f}%"
+    flag = "  REGRESSION" if worse else ""
+    return f"{name:<20} {metric:<10} {before:>12} {after:>12} {change:>9}{flag}"
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10.0,
+        help="Percentage a metric may get worse by before it is flagged.",
+    )
+    options = parser.parse_args(args)
+
+    with open(options.base) as file:
+        base_report = json.load(file)
+    with open(options.head) as file:
+        head_report = json.load(file)
+
+    for option in COMPARABLE_OPTIONS:
+        (before, after) = (
+            base_report["options"].get(option),
+            head_report["options"].get(option),
+        )
+        if before != after:
+            print(f"Warning: --{option} differs, {before} against {after}.")
+
+    (rows, regressed) = compare(base_report, head_report, options.threshold)
+    print(f"{'scenario':<20} {'metric':<10} {'base':>12} {'head':>12} {'change':>9}")
+    for row in rows:
+        print(format_row(*row))
+
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,342 @@
+"""
+    Load tests the REST API of a locally started server filled by generate_benchmark_data,
+    and writes the latency percentiles and throughput of every scenario to a JSON report.
+    Only the standard library is used, so it runs wherever the server does.
+"""
+import argparse
+import http.client
+import json
+import math
+import platform
+import random
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+REPORT_VERSION = 1
+
+
+class Client:
+    """A keep-alive HTTP connection to the server, one per worker thread."""
+
+    def __init__(self, base_url, token=None):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port
+        self.base_path = url.path.rstrip("/")
+        self.token = token
+        self.connection = None
+
+    def request(self, method, path, body=None):
+        headers = {"Accept": "application/json"}
+        if self.token is not None:
+            headers["Authorization"] = f"Token {self.token}"
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+            body = json.dumps(body)
+
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(
+                self.host, self.port, timeout=30
+            )
+        try:
+            self.connection.request(method, self.base_path + path, body, headers)
+            response = self.connection.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            self.connection.close()
+            self.connection = None
+            return (0, None)
+
+        if response.will_close:
+            self.connection.close()
+            self.connection = None
+        return (response.status, data)
+
+    def get_json(self, path):
+        (status, data) = self.request("GET", path)
+        if status != 200:
+            raise RuntimeError(f"GET {path} answered {status}.")
+        return json.loads(data)
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.recording = False
+
+    def request(self, client, label, method, path, expected=(200,), body=None):
+        start = time.perf_counter()
+        (status, data) = client.request(method, path, body)
+        elapsed = time.perf_counter() - start
+
+        if self.recording:
+            self.samples.setdefault(label, []).append((elapsed, status in expected))
+        return (status, data)
+
+
+class Session:
+    def __init__(self, client, recorder, rng, fixtures):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.fixtures = fixtures
+
+    def request(self, label, method, path, expected=(200,), body=None):
+        return self.recorder.request(self.client, label, method, path, expected, body)
+
+
+def browse_articles(session):
+    (status, data) = session.request("articles:list", "GET", "/blog/articles/")
+    if status == 200:
+        next_url = json.loads(data)["next"]
+        if next_url:
+            url = urlsplit(next_url)
+            session.request("articles:next", "GET", f"{url.path}?{url.query}")
+
+    article_id = session.rng.choice(session.fixtures["article_ids"])
+    session.request("articles:detail", "GET", f"/blog/articles/{article_id}/")
+    session.request("articles:trending", "GET", "/blog/articles/trending/")
+
+
+def read_threads(session):
+    article_id = session.rng.choice(session.fixtures["commented_article_ids"])
+    session.request(
+        "comments:thread", "GET", f"/blog/articles/{article_id}/comments/thread/"
+    )
+    session.request("comments:list", "GET", f"/blog/articles/{article_id}/comments/")
+
+
+def like_storm(session):
+    # Everyone likes and unlikes the same few articles, as when one goes viral.
+    article_id = session.rng.choice(session.fixtures["hot_article_ids"])
+    session.request(
+        "likes:create",
+        "POST",
+        f"/blog/articles/{article_id}/likes/",
+        expected=(201, 202, 400),
+        body={},
+    )
+    session.request(
+        "likes:dislike",
+        "DELETE",
+        f"/blog/articles/{article_id}/likes/dislike/",
+        expected=(204, 404),
+    )
+
+
+def login_burst(session):
+    (email, password) = session.rng.choice(session.fixtures["credentials"])
+    session.request(
+        "auth:login",
+        "POST",
+        "/auth/token/login/",
+        body={"email": email, "password": password},
+    )
+
+
+def fetch_category_hierarchy(session):
+    session.request("categories:hierarchical", "GET", "/blog/categories/hierarchical/")
+
+
+# (scenario, whether its workers log in first)
+SCENARIOS = {
+    "browse_articles": (browse_articles, False),
+    "read_threads": (read_threads, True),
+    "like_storm": (like_storm, True),
+    "login_burst": (login_burst, False),
+    "category_hierarchy": (fetch_category_hierarchy, False),
+}
+
+
+def load_fixtures(base_url, options):
+    """Picks the articles and users the scenarios request from the running server."""
+    client = Client(base_url)
+    articles = []
+    path = "/blog/articles/?limit=20"
+    while path and len(articles) < options.articles:
+        page = client.get_json(path)
+        articles.extend(page["results"])
+        if not page["next"]:
+            break
+        url = urlsplit(page["next"])
+        path = f"{url.path}?{url.query}"
+    if not articles:
+        raise RuntimeError("The server has no articles, run generate_benchmark_data.")
+
+    trending = client.get_json("/blog/articles/trending/?limit=20")["results"]
+    credentials = [
+        (f"{options.prefix}-{index}@benchmark.scribbly.com", options.password)
+        for index in range(options.logins)
+    ]
+
+    tokens = []
+    for email, password in credentials:
+        (status, data) = client.request(
+            "POST", "/auth/token/login/", {"email": email, "password": password}
+        )
+        if status != 200:
+            raise RuntimeError(f"Could not log in as {email}, check --prefix.")
+        tokens.append(json.loads(data)["token"])
+
+    return {
+        "article_ids": [article["id"] for article in articles],
+        "commented_article_ids": [
+            article["id"]
+            for article in articles
+            if article.get("counts", {}).get("comments", 1)
+        ]
+        or [article["id"] for article in articles],
+        "hot_article_ids": [article["id"] for article in trending]
+        or [article["id"] for article in articles[:5]],
+        "credentials": credentials,
+        "tokens": tokens,
+    }
+
+
+def run_scenario(name, base_url, fixtures, options):
+    (scenario, authenticated) = SCENARIOS[name]
+    recorders = []
+    threads = []
+    start = time.perf_counter()
+    warmup_ends = start + options.warmup
+    ends = warmup_ends + options.duration
+
+    def work(worker):
+        token = None
+        if authenticated:
+            token = fixtures["tokens"][worker % len(fixtures["tokens"])]
+        session = Session(
+            Client(base_url, token),
+            recorders[worker],
+            random.Random(f"{options.seed}:{name}:{worker}"),
+            fixtures,
+        )
+        while True:
+            now = time.perf_counter()
+            if now >= ends:
+                break
+            session.recorder.recording = now >= warmup_ends
+            scenario(session)
+
+    for worker in range(options.concurrency):
+        recorders.append(Recorder())
+        threads.append(threading.Thread(target=work, args=(worker,)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    samples = {}
+    for recorder in recorders:
+        for label, values in recorder.samples.items():
+            samples.setdefault(label, []).extend(values)
+    return summarize(samples, options.duration)
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    # Rounding first keeps float error, like 0.07 * 100 > 7, from skipping a rank.
+    rank = math.ceil(round(fraction * len(sorted_values), 9))
+    index = max(rank - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def summarize_samples(samples, duration):
+    latencies = sorted(elapsed * 1000 for (elapsed, _) in samples)
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for (_, ok) in samples if not ok),
+        "throughput": round(len(samples) / duration, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) or 0, 3),
+            "p90": round(percentile(latencies, 0.90) or 0, 3),
+            "p99": round(percentile(latencies, 0.99) or 0, 3),
+            "max": round(latencies[-1] if latencies else 0, 3),
+            "mean": round(sum(latencies) / len(latencies) if latencies else 0, 3),
+        },
+    }
+
+
+def summarize(samples, duration):
+    summary = summarize_samples(
+        [sample for values in samples.values() for sample in values], duration
+    )
+    summary["endpoints"] = {
+        label: summarize_samples(values, duration)
+        for (label, values) in sorted(samples.items())
+    }
+    return summary
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument(
+        "--prefix",
+        required=True,
+        help="Prefix generate_benchmark_data printed for its users.",
+    )
+    parser.add_argument("--password", default="benchmark")
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=sorted(SCENARIOS),
+        help="Scenarios to run, all of them by default.",
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--articles", type=int, default=200)
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="benchmark.json")
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    options = parse_args(args)
+    fixtures = load_fixtures(options.base_url, options)
+    report = {
+        "version": REPORT_VERSION,
+        "commit": get_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "options": {
+            key: value
+            for (key, value) in vars(options).items()
+            if key not in ("password", "output")
+        },
+        "scenarios": {},
+    }
+
+    for name in options.scenario or list(SCENARIOS):
+        print(f"Running {name} for {options.duration}s...")
+        summary = run_scenario(name, options.base_url, fixtures, options)
+        report["scenarios"][name] = summary
+        latency = summary["latency_ms"]
+        print(
+            f"  {summary['throughput']} req/s, p50 {latency['p50']} ms, "
+            f"p99 {latency['p99']} ms, {summary['errors']} errors"
+        )
+
+    with open(options.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Wrote {options.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+import pytest
+
+from benchmarks.run import percentile
+
+
+@pytest.mark.parametrize(
+    ("values", "fraction", "expected"),
+    [
+        (list(range(1, 11)), 0.5, 5),
+        (list(range(1, 11)), 0.9, 9),
+        (list(range(1, 101)), 0.99, 99),
+        (list(range(1, 101)), 1.0, 100),
+        (list(range(1, 101)), 0.07, 7),
+        ([7], 0.5, 7),
+        ([7], 0, 7),
+        ([], 0.5, None),
+    ],
+)
+def test_percentile_is_the_nearest_rank(values, fraction, expected):
+    assert percentile(values, fraction) == expected
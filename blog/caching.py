@@ -0,0 +1,134 @@
+"""
+    Caches API responses under dependency tags. Every tag has a version token in the cache,
+    invalidating a tag replaces its token, so every entry computed against the old token is
+    recomputed on its next read. Only one request recomputes an entry at a time, the others
+    are served the stale entry meanwhile.
+"""
+import time
+import hashlib
+from uuid import uuid4
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db import transaction
+
+from rest_framework.response import Response
+
+from users.constants import CacheTimeouts
+
+STALE_TIMEOUT = CacheTimeouts.MINUTE * 5
+LOCK_TIMEOUT = 10
+WAIT_INTERVAL = 0.05
+WAIT_ATTEMPTS = 20
+
+
+class UncacheableResponse(Exception):
+    pass
+
+
+def get_tag_key(tag):
+    return f"blog:tag:{tag}"
+
+
+def get_tag_versions(tags):
+    keys = [get_tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid4().hex, timeout=None)
+        versions.update(cache.get_many(missing))
+
+    return versions
+
+
+def invalidate_tags(*tags):
+    keys = [get_tag_key(tag) for tag in tags]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_or_compute(key, tags, compute, timeout):
+    versions = get_tag_versions(tags)
+    entry = cache.get(key)
+
+    if (
+        entry is not None
+        and entry["versions"] == versions
+        and entry["fresh_until"] > time.time()
+    ):
+        return entry["value"]
+
+    lock_key = f"{key}:lock"
+    if cache.add(lock_key, True, timeout=LOCK_TIMEOUT):
+        try:
+            value = compute()
+            cache.set(
+                key,
+                {
+                    "versions": versions,
+                    "value": value,
+                    "fresh_until": time.time() + timeout,
+                },
+                timeout=timeout + STALE_TIMEOUT,
+            )
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    if entry is not None:
+        return entry["value"]
+
+    for _ in range(WAIT_ATTEMPTS):
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and entry["versions"] == versions:
+            return entry["value"]
+
+    return compute()
+
+
+class CachedResponseMixin:
+    cache_timeout = CacheTimeouts.MINUTE * 5
+    cache_tags = []
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_cache_tags(self):
+        return self.cache_tags
+
+    def get_cache_key(self, request):
+        scope = f"user:{request.user.pk}" if request.user.is_authenticated else "anon"
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        location = f"{request.get_host()}{request.path}?{query}"
+        digest = hashlib.md5(location.encode()).hexdigest()
+        return f"blog:response:{scope}:{digest}"
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.method != "GET":
+            return handler(request, *args, **kwargs)
+
+        responses = []
+
+        def compute():
+            response = handler(request, *args, **kwargs)
+            responses.append(response)
+            if response.status_code != 200:
+                raise UncacheableResponse
+            return response.data
+
+        try:
+            data = get_or_compute(
+                self.get_cache_key(request),
+                self.get_cache_tags(),
+                compute,
+                self.cache_timeout,
+            )
+        except UncacheableResponse:
+            return responses[0]
+
+        return responses[0] if responses else Response(data)
@@ -0,0 +1,40 @@
+import inspect
+from importlib import import_module
+
+from django.core.checks import Tags, Warning, register
+
+from rest_framework import serializers
+
+from .planning import get_unplanned_fields
+
+SERIALIZER_MODULES = ["blog.serializers", "users.serializers"]
+
+
+def get_model_serializers():
+    for module_name in SERIALIZER_MODULES:
+        module = import_module(module_name)
+        for _, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ != module_name:
+                continue
+            if issubclass(cls, serializers.ModelSerializer):
+                yield cls
+
+
+@register(Tags.models)
+def check_serializer_query_plans(app_configs, **kwargs):
+    errors = []
+    for serializer_class in get_model_serializers():
+        for field_name in get_unplanned_fields(serializer_class(context={})):
+            errors.append(
+                Warning(
+                    f"Field '{field_name}' of {serializer_class.__name__} does not "
+                    "read a model field and may query the database for every object.",
+                    hint=(
+                        "Declare the lookups it reads in "
+                        "Meta.field_dependencies, or an empty list if it reads none."
+                    ),
+                    obj=serializer_class,
+                    id="blog.W001",
+                )
+            )
+    return errors
@@ -0,0 +1,22 @@
+"""
+  Defines keys for values stored in the cache and the tags cached responses depend on
+"""
+
+
+class CacheKeys:
+    CATEGORY_HIERARCHY = "blog:categories:hierarchical"
+
+
+class CacheTags:
+    ALL_ARTICLES = "article:*"
+    ALL_CATEGORIES = "category:*"
+    ALL_AUTHORS = "author:*"
+    TRENDING_ARTICLES = "article:trending"
+
+    @staticmethod
+    def article(article_id):
+        return f"article:{article_id}"
+
+    @staticmethod
+    def article_comments(article_id):
+        return f"article:{article_id}:comments"
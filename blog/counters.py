@@ -0,0 +1,195 @@
+"""
+    Keeps the denormalized counters of categories and articles in sync with the rows they count.
+"""
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Category, CategoryCounter, Article, ArticleLike, Comment
+from .caching import invalidate_tags
+from .constants import CacheKeys, CacheTags
+
+
+def path_to_ids(path):
+    return [int(pk) for pk in path.split(Category.PATH_SEPARATOR) if pk]
+
+
+def adjust_category_articles_count(category_id, delta):
+    if category_id is None:
+        return
+
+    path = (
+        Category.objects.filter(pk=category_id).values_list("path", flat=True).first()
+    )
+    if path is None:
+        return
+
+    CategoryCounter.objects.filter(pk=category_id).update(
+        articles_count=F("articles_count") + delta
+    )
+    CategoryCounter.objects.filter(pk__in=path_to_ids(path)).update(
+        subtree_articles_count=F("subtree_articles_count") + delta
+    )
+
+
+def move_category_subtree_articles_count(category_id, old_path, new_path):
+    subtree_articles_count = (
+        CategoryCounter.objects.filter(pk=category_id)
+        .values_list("subtree_articles_count", flat=True)
+        .first()
+    )
+    if not subtree_articles_count:
+        return
+
+    old_ancestor_ids = path_to_ids(old_path)[:-1]
+    new_ancestor_ids = path_to_ids(new_path)[:-1]
+
+    CategoryCounter.objects.filter(pk__in=old_ancestor_ids).update(
+        subtree_articles_count=F("subtree_articles_count") - subtree_articles_count
+    )
+    CategoryCounter.objects.filter(pk__in=new_ancestor_ids).update(
+        subtree_articles_count=F("subtree_articles_count") + subtree_articles_count
+    )
+
+
+def reconcile_category_counters(batch_size=1000):
+    articles_counts = dict(
+        Article.objects.filter(category__isnull=False)
+        .values("category")
+        .annotate(count=Count("id"))
+        .values_list("category", "count")
+    )
+
+    paths = dict(Category.objects.values_list("pk", "path"))
+    subtree_articles_counts = defaultdict(int)
+    for pk, path in paths.items():
+        articles_count = articles_counts.get(pk, 0)
+        for ancestor_id in path_to_ids(path) or [pk]:
+            subtree_articles_counts[ancestor_id] += articles_count
+
+    current = {
+        counter[0]: counter[1:]
+        for counter in CategoryCounter.objects.values_list(
+            "pk", "articles_count", "subtree_articles_count"
+        )
+    }
+    drifted = [
+        CategoryCounter(
+            category_id=pk,
+            articles_count=articles_counts.get(pk, 0),
+            subtree_articles_count=subtree_articles_counts[pk],
+        )
+        for pk in paths
+        if current.get(pk) != (articles_counts.get(pk, 0), subtree_articles_counts[pk])
+    ]
+
+    CategoryCounter.objects.bulk_update(
+        [counter for counter in drifted if counter.pk in current],
+        ["articles_count", "subtree_articles_count"],
+        batch_size=batch_size,
+    )
+    CategoryCounter.objects.bulk_create(
+        [counter for counter in drifted if counter.pk not in current],
+        batch_size=batch_size,
+    )
+
+    if drifted:
+        # Bulk writes send no signals, the cached counts are dropped here instead.
+        transaction.on_commit(lambda: cache.delete(CacheKeys.CATEGORY_HIERARCHY))
+        invalidate_tags(CacheTags.ALL_CATEGORIES)
+
+    return len(drifted)
+
+
+def adjust_article_counter(article_id, field_name, delta):
+    Article.objects.filter(pk=article_id).update(**{field_name: F(field_name) + delta})
+
+
+def add_comment_reply(parent_id, created_at):
+    Comment.objects.filter(pk=parent_id).update(
+        replies_count=F("replies_count") + 1,
+        last_reply_at=Greatest(
+            Coalesce("last_reply_at", Value(created_at)), Value(created_at)
+        ),
+    )
+
+
+def remove_comment_reply(parent_id):
+    Comment.objects.filter(pk=parent_id).update(
+        replies_count=F("replies_count") - 1,
+        last_reply_at=Subquery(
+            Comment.objects.filter(parent=OuterRef("pk"))
+            .order_by("-created_at")
+            .values("created_at")[:1]
+        ),
+    )
+
+
+def repair_article_counters(batch_size=1000):
+    repaired = 0
+    last_pk = 0
+
+    while True:
+        articles = list(
+            Article.objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .only("likes_count", "comments_count")[:batch_size]
+        )
+        if not articles:
+            return repaired
+
+        pks = [article.pk for article in articles]
+        repaired_ids = []
+        likes_counts = count_per_article(ArticleLike, pks)
+        comments_counts = count_per_article(Comment, pks)
+
+        for article in articles:
+            likes_count = likes_counts.get(article.pk, 0)
+            comments_count = comments_counts.get(article.pk, 0)
+            if (article.likes_count, article.comments_count) == (
+                likes_count,
+                comments_count,
+            ):
+                continue
+
+            # Only overwrite values that no concurrent like or comment has moved
+            # since they were read, the next run picks up whatever is skipped.
+            if Article.objects.filter(
+                pk=article.pk,
+                likes_count=article.likes_count,
+                comments_count=article.comments_count,
+            ).update(likes_count=likes_count, comments_count=comments_count):
+                repaired_ids.append(article.pk)
+
+        if repaired_ids:
+            invalidate_tags(
+                CacheTags.ALL_ARTICLES,
+                *[CacheTags.article(article_id) for article_id in repaired_ids],
+            )
+        repaired += len(repaired_ids)
+        last_pk = pks[-1]
+
+
+def count_per_article(model, article_ids):
+    return dict(
+        model.objects.filter(article_id__in=article_ids)
+        .values("article")
+        .annotate(count=Count("id"))
+        .values_list("article", "count")
+    )
+
+
+def count_related(model, field_name):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field_name: OuterRef("pk")})
+            .order_by()
+            .values(field_name)
+            .annotate(count=Count("id"))
+            .values("count")
+        ),
+        0,
+    )
@@ -0,0 +1,60 @@
+"""
+    Renders resized WebP and JPEG variants of uploaded images, so that clients can pick the smallest one that fits.
+"""
+import os
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from django.core.files.base import ContentFile
+
+VARIANT_WIDTHS = (320, 640, 1280)
+
+VARIANT_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 80, "optimize": True, "progressive": True}),
+}
+
+
+def create_image_variants(image_file):
+    with image_file.open("rb"):
+        image = ImageOps.exif_transpose(Image.open(image_file))
+        image.load()
+
+    (root, _) = os.path.splitext(image_file.name)
+    widths = [width for width in VARIANT_WIDTHS if width < image.width] or [
+        min(VARIANT_WIDTHS[0], image.width)
+    ]
+
+    variants = {extension: [] for extension in VARIANT_FORMATS}
+    for width in widths:
+        resized = image.copy()
+        resized.thumbnail((width, image.height), Image.LANCZOS)
+
+        for extension, (image_format, options) in VARIANT_FORMATS.items():
+            buffer = BytesIO()
+            convert(resized, image_format).save(buffer, format=image_format, **options)
+
+            name = image_file.storage.save(
+                f"{root}_{width}w.{extension}", ContentFile(buffer.getvalue())
+            )
+            variants[extension].append(
+                {"name": name, "width": resized.width, "height": resized.height}
+            )
+
+    return variants
+
+
+def delete_image_variants(storage, variants):
+    for renditions in (variants or {}).values():
+        for variant in renditions:
+            storage.delete(variant["name"])
+
+
+def convert(image, image_format):
+    has_alpha = image.mode in ("RGBA", "LA") or (
+        image.mode == "P" and "transparency" in image.info
+    )
+    if image_format == "WEBP" and has_alpha:
+        return image.convert("RGBA")
+    return image.convert("RGB")
@@ -0,0 +1,267 @@
+"""
+    Buffers likes and unlikes in Redis when BLOG_BUFFERED_LIKES is enabled. Every article has a
+    set of the authors who like it, so requests are answered from Redis alone, and every change
+    is queued for a worker that writes the queue to the database in batches.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import Q
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError, WatchError
+
+from .models import Article, ArticleLike, Author
+from .counters import count_related
+from .caching import invalidate_tags
+from .constants import CacheTags
+from users.constants import CacheTimeouts
+
+PENDING_KEY = "blog:likes:pending"
+PROCESSING_KEY = "blog:likes:processing"
+LOCK_KEY = "blog:likes:flush"
+LOCK_TIMEOUT = 60
+LIKERS_TIMEOUT = CacheTimeouts.DAY
+# Keeps the set of an article nobody likes from looking unloaded.
+SENTINEL = "-"
+LIKE, UNLIKE = "1", "0"
+
+# Set while a flush deletes unliked rows, the flush recounts the likes of its articles.
+recounting = ContextVar("recounting", default=False)
+
+
+class LikeReconciliationError(Exception):
+    pass
+
+
+def is_enabled():
+    return getattr(settings, "BLOG_BUFFERED_LIKES", False)
+
+
+def get_connection():
+    return get_redis_connection("default")
+
+
+def get_likers_key(article_id):
+    return f"blog:likes:{article_id}"
+
+
+def load_likers(connection, article_id):
+    """
+    Copies the likers of an article from the database unless its set is already loaded,
+    returns False if the article does not exist.
+    """
+    key = get_likers_key(article_id)
+    if connection.exists(key):
+        return True
+    if not Article.objects.filter(pk=article_id).exists():
+        return False
+
+    author_ids = ArticleLike.objects.filter(article_id=article_id).values_list(
+        "author_id", flat=True
+    )
+    with connection.pipeline() as pipe:
+        try:
+            pipe.watch(key)
+            if not pipe.exists(key):
+                pipe.multi()
+                pipe.sadd(key, SENTINEL, *author_ids)
+                pipe.expire(key, LIKERS_TIMEOUT)
+                pipe.execute()
+        except WatchError:
+            # Another request has loaded the set meanwhile.
+            pass
+
+    return True
+
+
+def record(article_id, author_id, operation):
+    """
+    Applies a like or unlike to the set of the article and queues it in one transaction,
+    returns whether the set changed or None if the article does not exist.
+    """
+    connection = get_connection()
+    if not load_likers(connection, article_id):
+        return None
+
+    key = get_likers_key(article_id)
+    with connection.pipeline() as pipe:
+        if operation == LIKE:
+            pipe.sadd(key, author_id)
+        else:
+            pipe.srem(key, author_id)
+        pipe.expire(key, LIKERS_TIMEOUT)
+        pipe.rpush(PENDING_KEY, f"{article_id}:{author_id}:{operation}")
+        (changed, *_) = pipe.execute()
+
+    return bool(changed)
+
+
+def like(article_id, author_id):
+    return record(article_id, author_id, LIKE)
+
+
+def unlike(article_id, author_id):
+    return record(article_id, author_id, UNLIKE)
+
+
+def has_liked(article_ids, author_id):
+    """Returns whether the author likes each of the given existing articles, by id."""
+    connection = get_connection()
+    with connection.pipeline(transaction=False) as pipe:
+        for article_id in article_ids:
+            pipe.exists(get_likers_key(article_id))
+        loaded = pipe.execute()
+    for article_id, is_loaded in zip(article_ids, loaded):
+        if not is_loaded:
+            load_likers(connection, article_id)
+
+    with connection.pipeline(transaction=False) as pipe:
+        for article_id in article_ids:
+            pipe.sismember(get_likers_key(article_id), author_id)
+        return dict(zip(article_ids, map(bool, pipe.execute())))
+
+
+def discard_likers(article_id):
+    get_connection().delete(get_likers_key(article_id))
+
+
+def collapse(entries):
+    """Keeps the last operation queued for every (article, author) pair."""
+    operations = {}
+    for entry in entries:
+        if isinstance(entry, bytes):
+            entry = entry.decode()
+        (article_id, author_id, operation) = entry.split(":")
+        operations[(int(article_id), int(author_id))] = operation
+    return operations
+
+
+def flush(batch_size=1000):
+    """
+    Writes the queued operations to the database and returns how many were written.
+
+    The queue is renamed before it is read, so operations queued meanwhile wait for the
+    next flush. It is read and written in chunks of batch_size, every chunk is only
+    removed after its database transaction commits, a flush that fails is retried with
+    the remaining operations, which are idempotent. Only one flush runs at a time.
+    """
+    connection = get_connection()
+    lock = connection.lock(LOCK_KEY, timeout=LOCK_TIMEOUT, blocking=False)
+    if not lock.acquire():
+        # Another flush is running.
+        return 0
+
+    try:
+        return flush_queue(connection, lock, batch_size)
+    finally:
+        if lock.owned():
+            lock.release()
+
+
+def flush_queue(connection, lock, batch_size):
+    if not connection.exists(PROCESSING_KEY):
+        try:
+            connection.rename(PENDING_KEY, PROCESSING_KEY)
+        except ResponseError:
+            # Nothing has been queued.
+            return 0
+
+    flushed = 0
+    while entries := connection.lrange(PROCESSING_KEY, 0, batch_size - 1):
+        with transaction.atomic():
+            apply_operations(collapse(entries), batch_size)
+        # Fails instead of removing the chunk if the lock expired and another flush
+        # has taken over the queue, and gives the next chunk the full timeout otherwise.
+        lock.reacquire()
+        connection.ltrim(PROCESSING_KEY, len(entries), -1)
+        flushed += len(entries)
+
+    return flushed
+
+
+@contextmanager
+def recount_likes():
+    token = recounting.set(True)
+    try:
+        yield
+    finally:
+        recounting.reset(token)
+
+
+def apply_operations(operations, batch_size):
+    article_ids = {article_id for (article_id, _) in operations}
+    author_ids = {author_id for (_, author_id) in operations}
+    existing_article_ids = set(
+        Article.objects.filter(pk__in=article_ids).values_list("pk", flat=True)
+    )
+    existing_author_ids = set(
+        Author.objects.filter(pk__in=author_ids).values_list("pk", flat=True)
+    )
+
+    liked = []
+    unliked = []
+    for (article_id, author_id), operation in operations.items():
+        if article_id not in existing_article_ids:
+            continue
+        if author_id not in existing_author_ids:
+            continue
+        if operation == LIKE:
+            liked.append((article_id, author_id))
+        else:
+            unliked.append((article_id, author_id))
+
+    ArticleLike.objects.bulk_create(
+        [
+            ArticleLike(article_id=article_id, author_id=author_id)
+            for (article_id, author_id) in liked
+        ],
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+    with recount_likes():
+        for start in range(0, len(unliked), batch_size):
+            ArticleLike.objects.filter(
+                pairs_filter(unliked[start : start + batch_size])
+            ).delete()
+
+    reconcile(liked, unliked, batch_size)
+
+    Article.objects.filter(pk__in=existing_article_ids).update(
+        likes_count=count_related(ArticleLike, "article")
+    )
+    invalidate_tags(
+        CacheTags.ALL_ARTICLES,
+        *[CacheTags.article(article_id) for article_id in existing_article_ids],
+    )
+
+
+def reconcile(liked, unliked, batch_size):
+    """Checks that every flushed pair is in the state it was last queued with."""
+    missing = 0
+    for start in range(0, len(liked), batch_size):
+        batch = liked[start : start + batch_size]
+        missing += len(batch) - ArticleLike.objects.filter(pairs_filter(batch)).count()
+
+    remaining = 0
+    for start in range(0, len(unliked), batch_size):
+        batch = unliked[start : start + batch_size]
+        remaining += ArticleLike.objects.filter(pairs_filter(batch)).count()
+
+    if missing or remaining:
+        raise LikeReconciliationError(
+            f"{missing} flushed likes are missing and {remaining} flushed unlikes remain."
+        )
+
+
+def pairs_filter(pairs):
+    author_ids_by_article = defaultdict(list)
+    for article_id, author_id in pairs:
+        author_ids_by_article[article_id].append(author_id)
+
+    query = Q(pk__in=[])
+    for article_id, author_ids in author_ids_by_article.items():
+        query |= Q(article_id=article_id, author_id__in=author_ids)
+    return query
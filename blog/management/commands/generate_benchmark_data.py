@@ -0,0 +1,452 @@
+import random
+import secrets
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from blog.counters import reconcile_category_counters
+from blog.models import (
+    Article,
+    ArticleImage,
+    ArticleLike,
+    Author,
+    Category,
+    CategoryCounter,
+    Comment,
+)
+from blog.search import update_search_vectors
+from blog.trending import refresh_trending_articles
+from chat.models import Message, Room
+from users.models import User
+
+IMAGE_VARIANTS = {
+    "webp": [
+        {"name": f"blog/articles/benchmark-{width}w.webp", "width": width, "height": 0}
+        for width in (320, 640, 1280)
+    ],
+}
+
+
+def power_law(rng, alpha, maximum):
+    """Draws from a Pareto distribution shifted to start at 0 and capped at `maximum`."""
+    return min(int(rng.paretovariate(alpha)) - 1, maximum)
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Keeps the created_at and updated_at values given to bulk_create."""
+    fields = [
+        field
+        for model in models
+        for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+    flags = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in flags:
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
+
+
+class CommentNode:
+    __slots__ = ("created_at", "author_id", "replies", "pk")
+
+    def __init__(self, created_at, author_id):
+        self.created_at = created_at
+        self.author_id = author_id
+        self.replies = []
+        self.pk = None
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills the database with synthetic users, categories, articles, likes, comments "
+        "and chat messages for benchmarking. Rows are bulk created in batches, so no "
+        "signals run and every denormalized field is written directly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10000)
+        parser.add_argument("--categories", type=int, default=200)
+        parser.add_argument("--category-depth", type=int, default=4)
+        parser.add_argument("--articles", type=int, default=50000)
+        parser.add_argument("--max-images", type=int, default=3)
+        parser.add_argument("--likes-alpha", type=float, default=1.1)
+        parser.add_argument("--max-likes", type=int, default=5000)
+        parser.add_argument("--comments-alpha", type=float, default=1.3)
+        parser.add_argument("--max-comments", type=int, default=200)
+        parser.add_argument("--replies-alpha", type=float, default=1.8)
+        parser.add_argument("--max-replies", type=int, default=20)
+        parser.add_argument("--reply-depth", type=int, default=3)
+        parser.add_argument("--rooms", type=int, default=5000)
+        parser.add_argument("--messages-alpha", type=float, default=1.2)
+        parser.add_argument("--max-messages", type=int, default=500)
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=30,
+            help="Rows are spread over this many days before now.",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int)
+        parser.add_argument(
+            "--password",
+            default="benchmark",
+            help="Password of every generated user, so load tests can log in.",
+        )
+
+    def handle(self, *args, **options):
+        if options["users"] < 2:
+            raise CommandError("At least 2 users are needed.")
+
+        self.options = options
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.prefix = f"bench-{secrets.token_hex(3)}"
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=options["days"])
+
+        with explicit_timestamps(
+            User,
+            Author,
+            Category,
+            Article,
+            ArticleImage,
+            ArticleLike,
+            Comment,
+            Room,
+            Message,
+        ):
+            (user_ids, author_ids) = self.generate_users()
+            category_ids = self.generate_categories()
+            self.generate_articles(author_ids, category_ids)
+            self.generate_rooms(user_ids)
+
+        self.log("Reconciling category counters and search vectors")
+        reconcile_category_counters(batch_size=self.batch_size)
+        self.update_search_vectors()
+        refresh_trending_articles()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Generated benchmark data prefixed '{self.prefix}'.")
+        )
+
+    def log(self, message):
+        self.stdout.write(f"[{self.prefix}] {message}")
+
+    def random_time(self, after=None):
+        start = (after or self.start).timestamp()
+        return datetime.fromtimestamp(
+            self.rng.uniform(start, self.now.timestamp()), tz=self.now.tzinfo
+        )
+
+    def generate_users(self):
+        password = make_password(self.options["password"])
+        user_ids = array("q")
+        author_ids = array("q")
+
+        for batch in batched(range(self.options["users"]), self.batch_size):
+            users = []
+            for index in batch:
+                joined_at = self.random_time()
+                users.append(
+                    User(
+                        username=f"{self.prefix}-{index}",
+                        email=f"{self.prefix}-{index}@benchmark.scribbly.com",
+                        password=password,
+                        is_active=True,
+                        date_joined=joined_at,
+                    )
+                )
+            with transaction.atomic():
+                users = User.objects.bulk_create(users)
+                # Bypasses create_author_for_new_user, which bulk_create never sends.
+                authors = Author.objects.bulk_create(
+                    [
+                        Author(
+                            user_id=user.pk,
+                            created_at=user.date_joined,
+                            updated_at=user.date_joined,
+                        )
+                        for user in users
+                    ]
+                )
+            user_ids.extend(user.pk for user in users)
+            author_ids.extend(author.pk for author in authors)
+            self.log(f"Users: {len(user_ids)}")
+
+        return (user_ids, author_ids)
+
+    def generate_categories(self):
+        count = self.options["categories"]
+        max_depth = max(self.options["category_depth"], 1)
+
+        # Every category picks an earlier one as its parent, moving up the tree
+        # until the parent is shallow enough, so early categories get more children.
+        parents = []
+        depths = []
+        for index in range(count):
+            if index == 0 or max_depth == 1 or self.rng.random() < 0.1:
+                parents.append(None)
+                depths.append(0)
+                continue
+            parent = self.rng.randrange(index)
+            while parent is not None and depths[parent] >= max_depth - 1:
+                parent = parents[parent]
+            parents.append(parent)
+            depths.append(0 if parent is None else depths[parent] + 1)
+
+        pks = [None] * count
+        paths = [None] * count
+        for depth in range(max_depth):
+            indexes = [index for index in range(count) if depths[index] == depth]
+            if not indexes:
+                break
+            categories = Category.objects.bulk_create(
+                [
+                    Category(
+                        title=f"Category {index}",
+                        heading=f"Category {index}",
+                        slug=f"{self.prefix}-category-{index}",
+                        parent_id=None
+                        if parents[index] is None
+                        else pks[parents[index]],
+                        created_at=self.start,
+                        updated_at=self.start,
+                    )
+                    for index in indexes
+                ],
+                batch_size=self.batch_size,
+            )
+            for index, category in zip(indexes, categories):
+                pks[index] = category.pk
+                parent_path = "" if parents[index] is None else paths[parents[index]]
+                paths[
+                    index
+                ] = (
+                    category.path
+                ) = f"{parent_path}{category.pk}{Category.PATH_SEPARATOR}"
+            Category.objects.bulk_update(
+                categories, ["path"], batch_size=self.batch_size
+            )
+
+        CategoryCounter.objects.bulk_create(
+            [CategoryCounter(category_id=pk) for pk in pks],
+            batch_size=self.batch_size,
+        )
+        self.log(f"Categories: {count}")
+        return pks
+
+    def generate_articles(self, author_ids, category_ids):
+        # Categories are as popular as their rank, the first is picked the most.
+        cum_weights = list(
+            accumulate(1 / rank for rank in range(1, len(category_ids) + 1))
+        )
+        generated = 0
+
+        for batch in batched(range(self.options["articles"]), self.batch_size):
+            categories = (
+                self.rng.choices(category_ids, cum_weights=cum_weights, k=len(batch))
+                if category_ids
+                else [None] * len(batch)
+            )
+            articles = []
+            plans = []
+            for index, category_id in zip(batch, categories):
+                created_at = self.random_time()
+                likes_count = min(
+                    power_law(
+                        self.rng, self.options["likes_alpha"], self.options["max_likes"]
+                    ),
+                    len(author_ids),
+                )
+                comments = self.plan_comments(created_at, author_ids)
+                articles.append(
+                    Article(
+                        heading=f"Benchmark article {index}",
+                        summary=f"Summary of benchmark article {index}",
+                        label=f"label-{index % 100}",
+                        slug=f"{self.prefix}-article-{index}",
+                        category_id=category_id,
+                        likes_count=likes_count,
+                        comments_count=self.count_comments(comments),
+                        created_at=created_at,
+                        updated_at=created_at,
+                    )
+                )
+                plans.append((likes_count, comments))
+
+            with transaction.atomic():
+                articles = Article.objects.bulk_create(articles)
+                self.generate_images(articles)
+                self.generate_likes(articles, plans, author_ids)
+                self.generate_comments(articles, plans)
+
+            generated += len(articles)
+            self.log(f"Articles: {generated}")
+
+    def plan_comments(self, created_at, author_ids, depth=0):
+        if depth == 0:
+            (alpha, maximum) = (
+                self.options["comments_alpha"],
+                self.options["max_comments"],
+            )
+        elif depth <= self.options["reply_depth"]:
+            (alpha, maximum) = (
+                self.options["replies_alpha"],
+                self.options["max_replies"],
+            )
+        else:
+            return []
+
+        nodes = []
+        for _ in range(power_law(self.rng, alpha, maximum)):
+            node = CommentNode(
+                self.random_time(after=created_at), self.rng.choice(author_ids)
+            )
+            node.replies = self.plan_comments(node.created_at, author_ids, depth + 1)
+            nodes.append(node)
+        return nodes
+
+    def count_comments(self, nodes):
+        return sum(1 + self.count_comments(node.replies) for node in nodes)
+
+    def generate_images(self, articles):
+        images = []
+        for article in articles:
+            for _ in range(self.rng.randint(0, self.options["max_images"])):
+                images.append(
+                    ArticleImage(
+                        article_id=article.pk,
+                        image="blog/articles/benchmark.jpg",
+                        variants=IMAGE_VARIANTS,
+                        created_at=article.created_at,
+                    )
+                )
+        ArticleImage.objects.bulk_create(images, batch_size=self.batch_size)
+
+    def generate_likes(self, articles, plans, author_ids):
+        likes = []
+        for article, (likes_count, _) in zip(articles, plans):
+            for author_id in self.rng.sample(author_ids, likes_count):
+                likes.append(
+                    ArticleLike(
+                        article_id=article.pk,
+                        author_id=author_id,
+                        created_at=self.random_time(after=article.created_at),
+                    )
+                )
+            if len(likes) >= self.batch_size:
+                ArticleLike.objects.bulk_create(likes)
+                likes = []
+        ArticleLike.objects.bulk_create(likes)
+
+    def generate_comments(self, articles, plans):
+        # Comments are created a level at a time, so every reply knows its parent's pk.
+        level = [
+            (article.pk, None, node)
+            for (article, (_, nodes)) in zip(articles, plans)
+            for node in nodes
+        ]
+        while level:
+            for chunk in batched(level, self.batch_size):
+                self.create_comments(chunk)
+            level = [
+                (article_id, node, reply)
+                for (article_id, _, node) in level
+                for reply in node.replies
+            ]
+
+    def create_comments(self, level):
+        comments = Comment.objects.bulk_create(
+            [
+                Comment(
+                    description="Benchmark comment",
+                    article_id=article_id,
+                    author_id=node.author_id,
+                    parent_id=parent.pk if parent else None,
+                    reply_to_id=parent.author_id if parent else None,
+                    replies_count=len(node.replies),
+                    last_reply_at=max(
+                        (reply.created_at for reply in node.replies), default=None
+                    ),
+                    created_at=node.created_at,
+                    updated_at=node.created_at,
+                )
+                for (article_id, parent, node) in level
+            ]
+        )
+        for (_, _, node), comment in zip(level, comments):
+            node.pk = comment.pk
+
+    def generate_rooms(self, user_ids):
+        # Room i pairs user a with the user `offset` places after it, which never
+        # repeats a pair in either direction while offset stays below half the users.
+        count = len(user_ids)
+        rooms = min(self.options["rooms"], count * ((count - 1) // 2))
+        generated = 0
+
+        for batch in batched(range(rooms), self.batch_size):
+            pairs = []
+            for index in batch:
+                a = index % count
+                b = (a + 1 + index // count) % count
+                created_at = self.random_time()
+                pairs.append((user_ids[a], user_ids[b], created_at))
+
+            with transaction.atomic():
+                Room.objects.bulk_create(
+                    [
+                        Room(user_id=user_id, contact_id=contact_id, created_at=at)
+                        for (a, b, at) in pairs
+                        for (user_id, contact_id) in [(a, b), (b, a)]
+                    ]
+                )
+                self.generate_messages(pairs)
+
+            generated += len(pairs)
+            self.log(f"Rooms: {generated}")
+
+    def generate_messages(self, pairs):
+        messages = []
+        for a, b, created_at in pairs:
+            count = power_law(
+                self.rng, self.options["messages_alpha"], self.options["max_messages"]
+            )
+            for _ in range(count):
+                (sender, recipient) = (a, b) if self.rng.random() < 0.5 else (b, a)
+                messages.append(
+                    Message(
+                        content="Benchmark message",
+                        sender_id=sender,
+                        recipient_id=recipient,
+                        created_at=self.random_time(after=created_at),
+                        seen=self.rng.random() < 0.8,
+                    )
+                )
+            if len(messages) >= self.batch_size:
+                Message.objects.bulk_create(messages)
+                messages = []
+        Message.objects.bulk_create(messages)
+
+    def update_search_vectors(self):
+        articles = Article.objects.filter(slug__startswith=f"{self.prefix}-")
+        pks = articles.order_by("pk").values_list("pk", flat=True)
+        for batch in batched(pks.iterator(), self.batch_size):
+            update_search_vectors(Article.objects.filter(pk__in=batch))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import Author, ArticleImage
+from blog.tasks import generate_image_variants
+
+
+class Command(BaseCommand):
+    help = (
+        "Queues variant rendering for every article image and avatar that has none yet."
+    )
+
+    def handle(self, *args, **options):
+        queued = 0
+
+        for model, image_field, variants_field in [
+            (ArticleImage, "image", "variants"),
+            (Author, "avatar", "avatar_variants"),
+        ]:
+            pks = (
+                model.objects.filter(**{f"{variants_field}__isnull": True})
+                .exclude(**{image_field: ""})
+                .exclude(**{f"{image_field}__isnull": True})
+                .values_list("pk", flat=True)
+            )
+            for pk in pks.iterator():
+                generate_image_variants.delay(
+                    model._meta.label, pk, image_field, variants_field
+                )
+                queued += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Queued {queued} images."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from blog.counters import reconcile_category_counters
+
+
+class Command(BaseCommand):
+    help = "Recomputes the direct and subtree article counters of every category."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        drifted = reconcile_category_counters(batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Reconciled {drifted} drifted category counters.")
+        )
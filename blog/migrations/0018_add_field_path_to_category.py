@@ -0,0 +1,19 @@
+# Generated by Django 4.1.2 on 2026-10-18 16:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0017_rename_related_names_childs_to_children"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="path",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=255
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.1.2 on 2026-10-18 16:45
+
+from collections import defaultdict
+from django.db import migrations
+
+
+def populate_path(apps, schema_editor):
+    Category = apps.get_model("blog", "Category")
+
+    categories = list(Category.objects.only("id", "parent_id"))
+    children_by_parent = defaultdict(list)
+    for category in categories:
+        children_by_parent[category.parent_id].append(category)
+
+    stack = [(category, "") for category in children_by_parent[None]]
+    while stack:
+        category, parent_path = stack.pop()
+        category.path = f"{parent_path}{category.pk}/"
+        stack.extend(
+            (child, category.path) for child in children_by_parent[category.pk]
+        )
+
+    Category.objects.bulk_update(categories, ["path"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0018_add_field_path_to_category"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_path, migrations.RunPython.noop),
+    ]
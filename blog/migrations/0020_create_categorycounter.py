@@ -0,0 +1,30 @@
+# Generated by Django 4.1.2 on 2026-10-18 16:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0019_populate_category_path"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategoryCounter",
+            fields=[
+                (
+                    "category",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="counter",
+                        serialize=False,
+                        to="blog.category",
+                    ),
+                ),
+                ("articles_count", models.IntegerField(default=0)),
+                ("subtree_articles_count", models.IntegerField(default=0)),
+            ],
+        ),
+    ]
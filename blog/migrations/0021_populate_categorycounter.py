@@ -0,0 +1,49 @@
+# Generated by Django 4.1.2 on 2026-10-18 16:46
+
+from collections import defaultdict
+from django.db import migrations
+from django.db.models import Count
+
+
+def populate_counters(apps, schema_editor):
+    Category = apps.get_model("blog", "Category")
+    CategoryCounter = apps.get_model("blog", "CategoryCounter")
+    Article = apps.get_model("blog", "Article")
+
+    articles_counts = dict(
+        Article.objects.filter(category__isnull=False)
+        .values("category")
+        .annotate(count=Count("id"))
+        .values_list("category", "count")
+    )
+
+    paths = dict(Category.objects.values_list("pk", "path"))
+    subtree_articles_counts = defaultdict(int)
+    for pk, path in paths.items():
+        ancestor_ids = [
+            int(ancestor_id) for ancestor_id in path.split("/") if ancestor_id
+        ]
+        for ancestor_id in ancestor_ids or [pk]:
+            subtree_articles_counts[ancestor_id] += articles_counts.get(pk, 0)
+
+    CategoryCounter.objects.bulk_create(
+        [
+            CategoryCounter(
+                category_id=pk,
+                articles_count=articles_counts.get(pk, 0),
+                subtree_articles_count=subtree_articles_counts[pk],
+            )
+            for pk in paths
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0020_create_categorycounter"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
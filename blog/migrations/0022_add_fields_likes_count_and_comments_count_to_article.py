@@ -0,0 +1,22 @@
+# Generated by Django 4.1.2 on 2026-10-18 16:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0021_populate_categorycounter"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="article",
+            name="comments_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="article",
+            name="likes_count",
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.1.2 on 2026-10-18 16:47
+
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_per_article(model):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(article=OuterRef("pk"))
+            .order_by()
+            .values("article")
+            .annotate(count=Count("id"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def populate_counters(apps, schema_editor):
+    Article = apps.get_model("blog", "Article")
+    ArticleLike = apps.get_model("blog", "ArticleLike")
+    Comment = apps.get_model("blog", "Comment")
+
+    Article.objects.update(
+        likes_count=count_per_article(ArticleLike),
+        comments_count=count_per_article(Comment),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0022_add_fields_likes_count_and_comments_count_to_article"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
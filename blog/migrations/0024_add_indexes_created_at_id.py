@@ -0,0 +1,30 @@
+# Generated by Django 4.1.2 on 2026-10-18 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0023_populate_article_counters"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                fields=["created_at", "id"], name="blog_articl_created_6629a7_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="articlelike",
+            index=models.Index(
+                fields=["created_at", "id"], name="blog_articl_created_92ce6d_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["created_at", "id"], name="blog_commen_created_88b29f_idx"
+            ),
+        ),
+    ]
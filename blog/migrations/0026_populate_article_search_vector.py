@@ -0,0 +1,35 @@
+# Generated by Django 4.1.2 on 2026-10-18 16:49
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+from django.contrib.postgres.search import SearchVector
+
+
+def populate_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    Article = apps.get_model("blog", "Article")
+    Category = apps.get_model("blog", "Category")
+
+    category_title = Subquery(
+        Category.objects.filter(pk=OuterRef("category_id")).values("title")
+    )
+    Article.objects.update(
+        search_vector=(
+            SearchVector("heading", weight="A", config="english")
+            + SearchVector("summary", weight="B", config="english")
+            + SearchVector("label", weight="B", config="english")
+            + SearchVector(category_title, weight="C", config="english")
+        )
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0025_add_field_search_vector_to_article"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_search_vector, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.1.2 on 2026-10-18 16:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0026_populate_article_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="article",
+            name="slug",
+            field=models.SlugField(editable=False, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="slug",
+            field=models.SlugField(editable=False, max_length=255, null=True),
+        ),
+    ]
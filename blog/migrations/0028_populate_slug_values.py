@@ -0,0 +1,36 @@
+# Generated by Django 4.1.2 on 2026-10-18 16:51
+
+from django.db import migrations
+from django.template.defaultfilters import slugify
+
+
+def populate_slugs(model, source_field):
+    taken = set()
+    rows = list(model.objects.order_by("pk").only("pk", source_field))
+
+    for row in rows:
+        base = (slugify(getattr(row, source_field)) or model._meta.model_name)[:245]
+        slug = base
+        suffix = 2
+        while slug in taken:
+            slug = f"{base}-{suffix}"
+            suffix += 1
+        taken.add(slug)
+        row.slug = slug
+
+    model.objects.bulk_update(rows, ["slug"], batch_size=1000)
+
+
+def populate_slug_values(apps, schema_editor):
+    populate_slugs(apps.get_model("blog", "Article"), "heading")
+    populate_slugs(apps.get_model("blog", "Category"), "title")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0027_add_field_slug_nullable_to_article_and_category"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_slug_values, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.1.2 on 2026-10-18 16:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0028_populate_slug_values"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="article",
+            name="slug",
+            field=models.SlugField(editable=False, max_length=255, unique=True),
+        ),
+        migrations.AlterField(
+            model_name="category",
+            name="slug",
+            field=models.SlugField(editable=False, max_length=255, unique=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.1.2 on 2026-10-18 16:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0029_alter_field_slug_to_unique_on_article_and_category"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="articleimage",
+            name="variants",
+            field=models.JSONField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="author",
+            name="avatar_variants",
+            field=models.JSONField(editable=False, null=True),
+        ),
+    ]
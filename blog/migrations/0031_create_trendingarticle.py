@@ -0,0 +1,30 @@
+# Generated by Django 4.1.2 on 2026-10-18 16:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0030_add_fields_image_variants_to_articleimage_and_author"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrendingArticle",
+            fields=[
+                (
+                    "article",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="trending",
+                        serialize=False,
+                        to="blog.article",
+                    ),
+                ),
+                ("score", models.FloatField(db_index=True)),
+                ("computed_at", models.DateTimeField()),
+            ],
+        ),
+    ]
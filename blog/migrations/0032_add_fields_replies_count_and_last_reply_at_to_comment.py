@@ -0,0 +1,22 @@
+# Generated by Django 4.1.2 on 2026-10-18 17:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0031_create_trendingarticle"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="comment",
+            name="last_reply_at",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name="comment",
+            name="replies_count",
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.1.2 on 2026-10-18 17:02
+
+from django.db import migrations
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def aggregate_replies(Comment, aggregate):
+    return Subquery(
+        Comment.objects.filter(parent=OuterRef("pk"))
+        .order_by()
+        .values("parent")
+        .annotate(value=aggregate)
+        .values("value")
+    )
+
+
+def populate_reply_fields(apps, schema_editor):
+    Comment = apps.get_model("blog", "Comment")
+
+    Comment.objects.filter(replies__isnull=False).update(
+        replies_count=Coalesce(aggregate_replies(Comment, Count("id")), 0),
+        last_reply_at=aggregate_replies(Comment, Max("created_at")),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0032_add_fields_replies_count_and_last_reply_at_to_comment"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_reply_fields, migrations.RunPython.noop),
+    ]
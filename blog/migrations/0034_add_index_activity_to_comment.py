@@ -0,0 +1,28 @@
+# Generated by Django 4.1.2 on 2026-10-18 17:02
+
+from django.db import migrations, models
+import django.db.models.functions.comparison
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0033_populate_comment_reply_fields"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                models.F("article"),
+                models.OrderBy(
+                    django.db.models.functions.comparison.Coalesce(
+                        "last_reply_at", "created_at"
+                    ),
+                    descending=True,
+                ),
+                models.OrderBy(models.F("id"), descending=True),
+                condition=models.Q(("parent__isnull", True)),
+                name="blog_comment_activity_idx",
+            ),
+        ),
+    ]
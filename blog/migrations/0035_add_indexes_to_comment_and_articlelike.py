@@ -0,0 +1,26 @@
+# Generated by Django 4.1.2 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0034_add_index_activity_to_comment"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="articlelike",
+            index=models.Index(
+                fields=["article", "created_at", "id"],
+                name="blog_articl_article_00a34c_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["article", "parent", "created_at", "id"],
+                name="blog_commen_article_24487d_idx",
+            ),
+        ),
+    ]
@@ -1,5 +1,9 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 
 User = get_user_model()
 
@@ -12,31 +16,91 @@ class BaseModel(models.Model):
         abstract = True
 
 
+class UniqueSlugMixin:
+    """
+    Retries a save whose slug was taken by a concurrent save after the pre_save signal
+    checked it. The slug is generated again on every attempt, so it gets the next suffix.
+    """
+
+    slug_attempts = 5
+
+    def save(self, *args, **kwargs):
+        for attempt in range(1, self.slug_attempts + 1):
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                if attempt == self.slug_attempts or not self.is_slug_taken():
+                    raise
+                self.slug = ""
+
+    def is_slug_taken(self):
+        return (
+            self.__class__.objects.filter(slug=self.slug).exclude(pk=self.pk).exists()
+        )
+
+
 class Author(BaseModel):
     phone_number = models.CharField(max_length=55, null=True, blank=True)
     avatar = models.ImageField(upload_to="blog/avatars", null=True, blank=True)
+    avatar_variants = models.JSONField(null=True, editable=False)
     user = models.OneToOneField(User, on_delete=models.CASCADE)
 
 
-class Category(BaseModel):
+class Category(UniqueSlugMixin, BaseModel):
     title = models.CharField(max_length=255, null=True, blank=True)
     heading = models.CharField(max_length=255, null=True, blank=True)
+    slug = models.SlugField(max_length=255, unique=True, editable=False)
     parent = models.ForeignKey(
         "self", on_delete=models.SET_NULL, null=True, related_name="children"
     )
+    path = models.CharField(max_length=255, default="", editable=False, db_index=True)
+
+    PATH_SEPARATOR = "/"
+
+    @property
+    def ancestor_ids(self):
+        return [int(pk) for pk in self.path.split(self.PATH_SEPARATOR) if pk][:-1]
+
+
+class CategoryCounter(models.Model):
+    category = models.OneToOneField(
+        Category, on_delete=models.CASCADE, primary_key=True, related_name="counter"
+    )
+    articles_count = models.IntegerField(default=0)
+    subtree_articles_count = models.IntegerField(default=0)
 
 
-class Article(BaseModel):
+class Article(UniqueSlugMixin, BaseModel):
     heading = models.CharField(max_length=255, null=True, blank=True)
     summary = models.CharField(max_length=255, null=True, blank=True)
     label = models.CharField(max_length=55, null=True, blank=True)
+    slug = models.SlugField(max_length=255, unique=True, editable=False)
     category = models.ForeignKey(
         Category, on_delete=models.SET_NULL, null=True, related_name="articles"
     )
+    likes_count = models.IntegerField(default=0)
+    comments_count = models.IntegerField(default=0)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"]),
+            GinIndex(fields=["search_vector"]),
+        ]
+
+
+class TrendingArticle(models.Model):
+    article = models.OneToOneField(
+        Article, on_delete=models.CASCADE, primary_key=True, related_name="trending"
+    )
+    score = models.FloatField(db_index=True)
+    computed_at = models.DateTimeField()
 
 
 class ArticleImage(models.Model):
     image = models.ImageField(upload_to="blog/articles")
+    variants = models.JSONField(null=True, editable=False)
     article = models.ForeignKey(
         Article, on_delete=models.CASCADE, related_name="images"
     )
@@ -52,6 +116,10 @@ class ArticleLike(models.Model):
         unique_together = [
             ["article", "author"],
         ]
+        indexes = [
+            models.Index(fields=["created_at", "id"]),
+            models.Index(fields=["article", "created_at", "id"]),
+        ]
 
     @property
     def user(self):
@@ -70,6 +138,22 @@ class Comment(BaseModel):
         "self", on_delete=models.CASCADE, related_name="replies", null=True
     )
     reply_to = models.ForeignKey(Author, on_delete=models.CASCADE, null=True)
+    replies_count = models.IntegerField(default=0)
+    last_reply_at = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"]),
+            models.Index(fields=["article", "parent", "created_at", "id"]),
+            # Top-level comments of an article by their latest activity.
+            models.Index(
+                F("article"),
+                Coalesce("last_reply_at", "created_at").desc(),
+                F("id").desc(),
+                name="blog_comment_activity_idx",
+                condition=Q(parent__isnull=True),
+            ),
+        ]
 
     @property
     def user(self):
@@ -1,6 +1,240 @@
-from rest_framework.pagination import LimitOffsetPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination,
+    LimitOffsetPagination,
+    _positive_int,
+)
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class DefaultLimitOffsetPagination(LimitOffsetPagination):
     default_limit = 10
     max_limit = 20
+
+
+class KeysetPagination(BasePagination):
+    """
+    Seeks past the last row of the previous page instead of using OFFSET, the
+    total count is only computed when asked for with ?count=true. Views may set
+    `cursor_ordering`, whose last field must be unique.
+    """
+
+    cursor_query_param = "cursor"
+    limit_query_param = "limit"
+    count_query_param = "count"
+    default_limit = 10
+    max_limit = 20
+    ordering = ("-created_at", "-id")
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = getattr(view, "cursor_ordering", self.ordering)
+        self.limit = self.get_limit(request)
+        self.count = queryset.count() if self.is_count_requested(request) else None
+
+        (values, reverse) = self.decode_cursor(request, queryset)
+        ordering = self.reverse_ordering(self.ordering) if reverse else self.ordering
+
+        if values is not None:
+            queryset = queryset.filter(self.get_seek_filter(ordering, values))
+
+        results = list(queryset.order_by(*ordering)[: self.limit + 1])
+        has_more = len(results) > self.limit
+        self.page = results[: self.limit]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = values is not None
+
+        return self.page
+
+    def get_paginated_response(self, data):
+        response = OrderedDict()
+        if self.count is not None:
+            response["count"] = self.count
+        response["next"] = self.get_next_link()
+        response["previous"] = self.get_previous_link()
+        response["results"] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "count": {
+                    "type": "integer",
+                    "example": 123,
+                },
+                "next": {
+                    "type": "string",
+                    "nullable": True,
+                },
+                "previous": {
+                    "type": "string",
+                    "nullable": True,
+                },
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.limit_query_param,
+                "required": False,
+                "in": "query",
+                "schema": {"type": "integer"},
+            },
+            {
+                "name": self.count_query_param,
+                "required": False,
+                "in": "query",
+                "schema": {"type": "boolean"},
+            },
+        ]
+
+    def get_limit(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.limit_query_param],
+                strict=True,
+                cutoff=self.max_limit,
+            )
+        except (KeyError, ValueError):
+            return self.default_limit
+
+    def is_count_requested(self, request):
+        value = request.query_params.get(self.count_query_param, "")
+        return value.lower() in ("1", "true")
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, instance, reverse):
+        values = [
+            self.get_field_value(instance, field.lstrip("-")) for field in self.ordering
+        ]
+        token = json.dumps({"v": values, "r": int(reverse)}, default=str)
+        encoded = urlsafe_b64encode(token.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return (None, False)
+
+        try:
+            token = json.loads(urlsafe_b64decode(encoded.encode()).decode())
+            if len(token["v"]) != len(self.ordering):
+                raise ValueError
+            values = [
+                self.to_python(queryset, field.lstrip("-"), value)
+                for (field, value) in zip(self.ordering, token["v"])
+            ]
+            return (values, bool(token["r"]))
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_seek_filter(self, ordering, values):
+        conditions = []
+        for index, field in enumerate(ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            equal_to_previous = {
+                previous.lstrip("-"): value
+                for (previous, value) in zip(ordering[:index], values)
+            }
+            conditions.append(
+                Q(**equal_to_previous, **{f"{name}__{lookup}": values[index]})
+            )
+
+        # The OR chain alone cannot bound an index scan, the leading field can.
+        first = ordering[0]
+        lookup = "lte" if first.startswith("-") else "gte"
+        bound = Q(**{f"{first.lstrip('-')}__{lookup}": values[0]})
+        return bound & reduce(or_, conditions)
+
+    def reverse_ordering(self, ordering):
+        return tuple(
+            field[1:] if field.startswith("-") else f"-{field}" for field in ordering
+        )
+
+    def get_field_value(self, instance, field_name):
+        return getattr(instance, field_name)
+
+    def to_python(self, queryset, field_name, value):
+        try:
+            field = queryset.model._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            field = queryset.query.annotations[field_name].output_field
+        return field.to_python(value)
+
+
+class OptInKeysetPagination(BasePagination):
+    """
+    Offset pagination unless the request opts into keyset pagination by passing a
+    cursor, an empty one for the first page. Offset clients keep working while
+    high-volume clients move to cursors. Both modes use the keyset ordering.
+    """
+
+    offset_class = DefaultLimitOffsetPagination
+    keyset_class = KeysetPagination
+    ordering = KeysetPagination.ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.paginator = self.keyset_class()
+        else:
+            ordering = getattr(view, "cursor_ordering", self.ordering)
+            queryset = queryset.order_by(*ordering)
+            self.paginator = self.offset_class()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return self.keyset_class().get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            *self.offset_class().get_schema_operation_parameters(view),
+            *[
+                parameter
+                for parameter in self.keyset_class().get_schema_operation_parameters(
+                    view
+                )
+                if parameter["name"] != self.keyset_class.limit_query_param
+            ],
+        ]
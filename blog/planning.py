@@ -0,0 +1,238 @@
+"""
+    Derives the select_related, prefetch_related and only() calls a queryset needs from the
+    fields of the serializer that renders it. Fields whose source is not a model field, like
+    method fields, declare the lookups they read in `Meta.field_dependencies`.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.db.models.constants import LOOKUP_SEP
+
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.relations import ManyRelatedField, RelatedField
+
+
+class QueryPlan:
+    def __init__(self, model):
+        self.model = model
+        self.select_related = set()
+        self.only = {model._meta.pk.name}
+        self.whole = set()
+        self.prefetches = {}
+        self.restricted = True
+
+    def add_lookup(self, lookup, serializer=None, column=False):
+        """
+        Plans the loading of `lookup`, a path of field names relative to the model. The
+        related object the path ends at is loaded whole, as `serializer` needs it, or only
+        as its foreign key column when `column` is set. Returns False if the path does not
+        resolve to model fields.
+        """
+        model = self.model
+        prefix = ""
+        parts = lookup.split(LOOKUP_SEP) if lookup else []
+
+        for index, name in enumerate(parts):
+            field = get_model_field(model, name)
+            if field is None:
+                # Annotations, or properties which may read any field of their object.
+                if prefix:
+                    self.whole.add(prefix)
+                return False
+
+            path = prefix + (field.name if name == "pk" else name)
+            if not field.is_relation:
+                self.only.add(path)
+                return True
+
+            if field.many_to_many or field.one_to_many:
+                rest = LOOKUP_SEP.join(parts[index + 1 :])
+                self.get_prefetch(path, field).add_lookup(rest, serializer, column)
+                return True
+
+            is_last = index == len(parts) - 1
+            if field.concrete:
+                self.only.add(path)
+                if column and is_last:
+                    return True
+            self.select_related.add(path)
+            model = field.related_model
+            prefix = path + LOOKUP_SEP
+
+        if serializer is not None:
+            plan_fields(self, serializer, prefix)
+        elif prefix:
+            self.whole.add(prefix)
+        else:
+            self.restricted = False
+        return True
+
+    def get_prefetch(self, lookup, field):
+        if lookup not in self.prefetches:
+            plan = QueryPlan(field.related_model)
+            if field.one_to_many:
+                # Prefetched rows are matched to their parent by this column.
+                plan.only.add(field.field.name)
+            else:
+                plan.restricted = False
+            self.prefetches[lookup] = plan
+        return self.prefetches[lookup]
+
+    def get_only(self):
+        return sorted(
+            path
+            for path in self.only
+            if not any(path.startswith(prefix) for prefix in self.whole)
+        )
+
+    def apply(self, queryset, prefetch_querysets=None, restrict_fields=True):
+        prefetch_querysets = prefetch_querysets or {}
+
+        if self.select_related:
+            queryset = queryset.select_related(*sorted(self.select_related))
+        for lookup, plan in sorted(self.prefetches.items()):
+            prefetch_queryset = prefetch_querysets.get(
+                lookup, plan.model._default_manager.all()
+            )
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    lookup,
+                    queryset=plan.apply(
+                        prefetch_queryset, restrict_fields=restrict_fields
+                    ),
+                )
+            )
+        if restrict_fields and self.restricted:
+            queryset = queryset.only(*self.get_only())
+
+        return queryset
+
+
+def get_model_field(model, name):
+    if name == "pk":
+        return model._meta.pk
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        pass
+    # Reverse relations without a related_name are accessed as `<model>_set`.
+    for relation in model._meta.related_objects:
+        if relation.get_accessor_name() == name:
+            return relation
+    return None
+
+
+def get_field_dependencies(serializer):
+    meta = getattr(serializer, "Meta", None)
+    return getattr(meta, "field_dependencies", {})
+
+
+def plan_serializer(serializer, extra_lookups=()):
+    """Returns the QueryPlan of a bound model serializer, or None for other serializers."""
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+
+    model = getattr(getattr(serializer, "Meta", None), "model", None)
+    if model is None:
+        return None
+
+    plan = QueryPlan(model)
+    plan_fields(plan, serializer, "")
+    for lookup in extra_lookups:
+        plan.add_lookup(lookup)
+    return plan
+
+
+def plan_fields(plan, serializer, prefix):
+    dependencies = get_field_dependencies(serializer)
+
+    for field in serializer._readable_fields:
+        if field.field_name in dependencies:
+            for lookup in dependencies[field.field_name]:
+                plan.add_lookup(prefix + lookup)
+            continue
+
+        if field.source == "*":
+            if isinstance(field, serializers.BaseSerializer):
+                plan_fields(plan, field, prefix)
+            else:
+                # Undeclared method fields may read anything.
+                plan.add_lookup(prefix[: -len(LOOKUP_SEP)])
+            continue
+
+        lookup = prefix + LOOKUP_SEP.join(field.source_attrs)
+
+        if isinstance(field, serializers.ListSerializer):
+            plan.add_lookup(lookup, field.child)
+        elif isinstance(field, serializers.BaseSerializer):
+            plan.add_lookup(lookup, field)
+        elif isinstance(field, ManyRelatedField):
+            plan.add_lookup(lookup + LOOKUP_SEP + "pk")
+        elif isinstance(field, RelatedField) and field.use_pk_only_optimization():
+            plan.add_lookup(lookup, column=True)
+        else:
+            plan.add_lookup(lookup)
+
+
+class QueryPlanMixin:
+    """
+    Plans the queryset of a view from the serializer it renders. Views may set
+    `prefetch_querysets` to filter prefetched relations, and override
+    `get_required_lookups` for fields read outside the serializer.
+    """
+
+    prefetch_querysets = {}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        plan = plan_serializer(
+            self.get_rendering_serializer(), self.get_required_lookups()
+        )
+        if plan is None:
+            return queryset
+
+        request = getattr(self, "request", None)
+        restrict_fields = request is not None and request.method in SAFE_METHODS
+        return plan.apply(queryset, self.prefetch_querysets, restrict_fields)
+
+    def get_rendering_serializer(self):
+        return self.get_serializer_class()(context=self.get_serializer_context())
+
+    def get_rendered_fields(self):
+        return self.get_rendering_serializer().fields
+
+    def get_required_lookups(self):
+        lookups = []
+
+        paginator = getattr(self, "paginator", None)
+        ordering = getattr(
+            self, "cursor_ordering", getattr(paginator, "ordering", None)
+        )
+        if isinstance(ordering, (list, tuple)):
+            lookups.extend(field.lstrip("-") for field in ordering)
+
+        return lookups
+
+
+def get_unplanned_fields(serializer):
+    """
+    Returns the names of the fields the query plan of a model serializer cannot account
+    for, which may run queries for every object they render.
+    """
+    model = serializer.Meta.model
+    dependencies = get_field_dependencies(serializer)
+    unplanned = []
+
+    for field in serializer._readable_fields:
+        if field.field_name in dependencies:
+            continue
+        if field.source == "*":
+            if not isinstance(field, serializers.BaseSerializer):
+                unplanned.append(field.field_name)
+            continue
+
+        lookup = LOOKUP_SEP.join(field.source_attrs)
+        if not QueryPlan(model).add_lookup(lookup):
+            unplanned.append(field.field_name)
+
+    return unplanned
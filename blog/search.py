@@ -0,0 +1,106 @@
+"""
+    Full-text search over articles, backed by a stored search vector on PostgreSQL with a plain
+    substring match fallback on other databases.
+"""
+from django.db import connection
+from django.db.models import Q, F, Case, When, Value, FloatField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Concat, Replace
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    SearchHeadline,
+)
+
+from .models import Category, Article
+
+SEARCH_CONFIG = "english"
+# The escapes of django.utils.html.escape, ampersands first.
+HTML_ESCAPES = [
+    ("&", "&amp;"),
+    ("<", "&lt;"),
+    (">", "&gt;"),
+    ('"', "&quot;"),
+    ("'", "&#x27;"),
+]
+
+
+def is_full_text_search_supported():
+    return connection.vendor == "postgresql"
+
+
+def article_search_vector():
+    category_title = Subquery(
+        Category.objects.filter(pk=OuterRef("category_id")).values("title")
+    )
+    return (
+        SearchVector("heading", weight="A", config=SEARCH_CONFIG)
+        + SearchVector("summary", weight="B", config=SEARCH_CONFIG)
+        + SearchVector("label", weight="B", config=SEARCH_CONFIG)
+        + SearchVector(category_title, weight="C", config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(queryset):
+    if is_full_text_search_supported():
+        queryset.update(search_vector=article_search_vector())
+
+
+def search_articles(queryset, text):
+    if not is_full_text_search_supported():
+        return fallback_search_articles(queryset, text)
+
+    query = SearchQuery(text, search_type="websearch", config=SEARCH_CONFIG)
+    return (
+        queryset.filter(search_vector=query)
+        .annotate(rank=SearchRank(F("search_vector"), query))
+        .annotate(
+            headline=SearchHeadline(
+                escape_html(searchable_text()),
+                query,
+                config=SEARCH_CONFIG,
+                start_sel="<mark>",
+                stop_sel="</mark>",
+            )
+        )
+        .order_by("-rank", "-id")
+    )
+
+
+def fallback_search_articles(queryset, text):
+    return (
+        queryset.filter(
+            Q(heading__icontains=text)
+            | Q(summary__icontains=text)
+            | Q(label__icontains=text)
+            | Q(category__title__icontains=text)
+        )
+        .annotate(
+            rank=Case(
+                When(heading__icontains=text, then=Value(1.0)),
+                When(Q(summary__icontains=text) | Q(label__icontains=text), then=0.4),
+                default=Value(0.2),
+                output_field=FloatField(),
+            )
+        )
+        .annotate(headline=escape_html(searchable_text()))
+        .order_by("-rank", "-id")
+    )
+
+
+def searchable_text():
+    return Concat(
+        Coalesce("heading", Value("")),
+        Value(" "),
+        Coalesce("summary", Value("")),
+    )
+
+
+def escape_html(expression):
+    """
+    Escapes text in the database, so a headline is safe to render as HTML and only its
+    <mark> tags are markup.
+    """
+    for character, entity in HTML_ESCAPES:
+        expression = Replace(expression, Value(character), Value(entity))
+    return expression
@@ -1,14 +1,225 @@
+from copy import deepcopy
+from datetime import datetime
+from functools import lru_cache
+from operator import attrgetter
+
+from django.db import models
+from django.utils import timezone
 from django.urls import reverse
+from django.core.files.storage import default_storage
 from django.contrib.auth import get_user_model
-from django.template.defaultfilters import slugify
 
 from rest_framework import serializers
+from rest_framework.fields import SkipField
+from rest_framework.settings import ISO_8601, api_settings
+from rest_framework.relations import PKOnlyObject
 
 from .models import Author, Category, Article, ArticleImage, ArticleLike, Comment
 
 User = get_user_model()
 
 
+class DynamicFieldsMixin:
+    """
+    Narrows the top-level serializer of a response to the names in the `fields`
+    context and adds the `Meta.expandable_fields` named in the `expand` context.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.is_top_level():
+            return fields
+
+        expand = self.context.get("expand", set())
+        for name, field in getattr(self.Meta, "expandable_fields", {}).items():
+            if name in expand:
+                fields[name] = deepcopy(field)
+
+        requested = self.context.get("fields")
+        if requested:
+            for name in list(fields):
+                if name not in requested and name not in expand:
+                    del fields[name]
+
+        return fields
+
+    def is_top_level(self):
+        parent = getattr(self, "parent", None)
+        if isinstance(parent, serializers.ListSerializer):
+            parent = getattr(parent, "parent", None)
+        return parent is None
+
+
+def compile_representation(serializer):
+    """
+    Returns a function producing the same representation as `serializer.to_representation`,
+    with the getter of every field resolved once instead of for every instance.
+    """
+    if (
+        type(serializer).to_representation
+        is not serializers.Serializer.to_representation
+    ):
+        return serializer.to_representation
+
+    getters = [
+        (field.field_name, compile_field(serializer, field))
+        for field in serializer._readable_fields
+    ]
+
+    def to_representation(instance):
+        representation = {}
+        for name, getter in getters:
+            try:
+                representation[name] = getter(instance)
+            except SkipField:
+                pass
+        return representation
+
+    return to_representation
+
+
+def compile_field(serializer, field):
+    compiler = getattr(serializer, f"compile_{field.field_name}", None)
+    if compiler is not None:
+        return compiler()
+
+    if isinstance(field, serializers.SerializerMethodField):
+        return getattr(serializer, field.method_name)
+
+    if isinstance(field, serializers.ListSerializer) and (
+        type(field).to_representation is serializers.ListSerializer.to_representation
+    ):
+        child = compile_representation(field.child)
+
+        def get_many(instance):
+            value = field.get_attribute(instance)
+            if value is None:
+                return None
+            if isinstance(value, models.Manager):
+                value = value.all()
+            return [child(item) for item in value]
+
+        return get_many
+
+    if isinstance(field, serializers.Serializer):
+        represent = compile_representation(field)
+    elif type(field) is serializers.DateTimeField:
+        represent = compile_datetime(field)
+    elif type(field).to_representation is serializers.ReadOnlyField.to_representation:
+        represent = None
+    else:
+        represent = field.to_representation
+
+    if is_concrete_attribute(serializer, field):
+        # Concrete columns can neither be missing, callable nor related objects.
+        get = attrgetter(field.source_attrs[0])
+    else:
+        get = field.get_attribute
+
+    def get_one(instance):
+        value = get(instance)
+        check_for_none = value.pk if isinstance(value, PKOnlyObject) else value
+        if check_for_none is None:
+            return None
+        return represent(value) if represent is not None else value
+
+    return get_one
+
+
+def compile_datetime(field):
+    # Resolves the output format and the current timezone once.
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    field_timezone = (
+        field.timezone if hasattr(field, "timezone") else field.default_timezone()
+    )
+    if (
+        output_format is None
+        or output_format.lower() != ISO_8601
+        or field_timezone is None
+    ):
+        return field.to_representation
+
+    def represent(value):
+        if not isinstance(value, datetime) or not timezone.is_aware(value):
+            return field.to_representation(value)
+        try:
+            value = value.astimezone(field_timezone).isoformat()
+        except OverflowError:
+            return field.to_representation(value)
+        return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+    return represent
+
+
+def is_concrete_attribute(serializer, field):
+    model = getattr(getattr(serializer, "Meta", None), "model", None)
+    if model is None or len(field.source_attrs) != 1:
+        return False
+    return field.source_attrs[0] in get_concrete_attnames(model)
+
+
+@lru_cache(maxsize=None)
+def get_concrete_attnames(model):
+    return frozenset(
+        model_field.attname
+        for model_field in model._meta.concrete_fields
+        if not model_field.is_relation
+    )
+
+
+class CompiledListSerializer(serializers.ListSerializer):
+    """
+    Read-only list serializer for hot endpoints, renders the same data as ListSerializer
+    with its child compiled once per response.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        to_representation = compile_representation(self.child)
+        return [to_representation(item) for item in iterable]
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    def to_representation(self, variants):
+        request = self.context.get("request")
+        representation = {}
+
+        for extension, sources in variants.items():
+            sources = [
+                {
+                    "url": self.build_url(request, source["name"]),
+                    "width": source["width"],
+                    "height": source["height"],
+                }
+                for source in sources
+            ]
+            representation[extension] = {
+                "srcset": ", ".join(
+                    f"{source['url']} {source['width']}w" for source in sources
+                ),
+                "sources": sources,
+            }
+
+        return representation
+
+    def build_url(self, request, name):
+        url = default_storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+
+
+class RenderedImageField(serializers.ImageField):
+    """An image that is only served once its variants have been rendered."""
+
+    def __init__(self, variants_field, **kwargs):
+        super().__init__(**kwargs)
+        self.variants_field = variants_field
+
+    def to_representation(self, value):
+        if not value or getattr(value.instance, self.variants_field) is None:
+            return None
+        return super().to_representation(value)
+
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -17,26 +228,39 @@ class UserSerializer(serializers.ModelSerializer):
 
 class SimpleAuthorSerializer(serializers.ModelSerializer):
     username = serializers.SerializerMethodField(read_only=True)
+    avatar = RenderedImageField("avatar_variants", read_only=True)
+    avatar_variants = ImageVariantsField()
 
     class Meta:
         model = Author
-        fields = ["id", "username", "avatar"]
+        fields = ["id", "username", "avatar", "avatar_variants"]
+        field_dependencies = {
+            "username": ["user__username"],
+            "avatar": ["avatar", "avatar_variants"],
+        }
 
     def get_username(self, author):
         return author.user.username
 
 
-class AuthorSerializer(serializers.ModelSerializer):
+class AuthorSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    avatar = RenderedImageField("avatar_variants", required=False, allow_null=True)
+    avatar_variants = ImageVariantsField()
 
     class Meta:
         model = Author
-        fields = ["id", "phone_number", "avatar", "user"]
+        fields = ["id", "phone_number", "avatar", "avatar_variants", "user"]
+        field_dependencies = {"avatar": ["avatar", "avatar_variants"]}
 
 
-class CategorySerializer(serializers.ModelSerializer):
-    slug = serializers.SerializerMethodField(read_only=True)
-    articles_count = serializers.IntegerField(read_only=True)
+class CategorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    articles_count = serializers.IntegerField(
+        source="counter.articles_count", read_only=True
+    )
+    subtree_articles_count = serializers.IntegerField(
+        source="counter.subtree_articles_count", read_only=True
+    )
 
     class Meta:
         model = Category
@@ -46,41 +270,54 @@ class CategorySerializer(serializers.ModelSerializer):
             "heading",
             "slug",
             "articles_count",
+            "subtree_articles_count",
             "parent",
             "children",
         ]
-        read_only_fields = ["slug", "articles_count", "children"]
+        read_only_fields = [
+            "slug",
+            "articles_count",
+            "subtree_articles_count",
+            "children",
+        ]
 
-    def get_slug(self, category):
-        return slugify(category.title)
+    def validate_parent(self, parent):
+        if (
+            parent is not None
+            and self.instance is not None
+            and self.instance.path
+            and parent.path.startswith(self.instance.path)
+        ):
+            raise serializers.ValidationError(
+                "A category cannot be moved under itself or its descendants."
+            )
+        return parent
 
 
 class SimpleCategorySerializer(serializers.ModelSerializer):
-    slug = serializers.SerializerMethodField(read_only=True)
-
     class Meta:
         model = Category
         fields = ["title", "slug"]
 
-    def get_slug(self, category):
-        return slugify(category.title)
-
 
 class ArticleImageSerializer(serializers.ModelSerializer):
+    variants = ImageVariantsField()
+
     class Meta:
         model = ArticleImage
-        fields = ["id", "image"]
+        fields = ["id", "image", "variants"]
 
     def create(self, validated_data):
         validated_data["article_id"] = self.context["article_id"]
         return super().create(validated_data)
 
 
-class ArticleSerializer(serializers.ModelSerializer):
+class ArticleSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     category = SimpleCategorySerializer(read_only=True)
-    slug = serializers.SerializerMethodField(read_only=True)
     images = ArticleImageSerializer(many=True, read_only=True)
     counts = serializers.SerializerMethodField(read_only=True)
+    # Only annotated for authenticated requests.
+    liked_by_me = serializers.BooleanField(read_only=True, default=False)
 
     class Meta:
         model = Article
@@ -93,12 +330,19 @@ class ArticleSerializer(serializers.ModelSerializer):
             "slug",
             "images",
             "counts",
+            "liked_by_me",
             "created_at",
             "updated_at",
         ]
-
-    def get_slug(self, article):
-        return slugify(article.heading)
+        expandable_fields = {
+            "category": CategorySerializer(read_only=True),
+        }
+        field_dependencies = {
+            "counts": ["likes_count", "comments_count"],
+            # Annotated by the view.
+            "liked_by_me": [],
+        }
+        list_serializer_class = CompiledListSerializer
 
     def get_counts(self, article):
         return {
@@ -107,6 +351,25 @@ class ArticleSerializer(serializers.ModelSerializer):
         }
 
 
+class ArticleSearchSerializer(ArticleSerializer):
+    rank = serializers.FloatField(read_only=True)
+    headline = serializers.CharField(read_only=True)
+
+    class Meta(ArticleSerializer.Meta):
+        fields = ArticleSerializer.Meta.fields + ["rank", "headline"]
+        field_dependencies = {
+            **ArticleSerializer.Meta.field_dependencies,
+            # Annotated by the search.
+            "rank": [],
+            "headline": [],
+        }
+
+
+class ArticleLikedByMeSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    liked_by_me = serializers.BooleanField()
+
+
 class ArticleCreateUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Article
@@ -154,13 +417,15 @@ class CommentReplyCreateSerializer(serializers.ModelSerializer):
         return value
 
 
-class CommentReplySerializer(serializers.ModelSerializer):
+class CommentReplySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     author = SimpleAuthorSerializer(read_only=True)
     reply_to = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = Comment
         fields = ["id", "description", "author", "reply_to"]
+        field_dependencies = {"reply_to": ["reply_to__user__username"]}
+        list_serializer_class = CompiledListSerializer
 
     def get_reply_to(self, comment):
         request = self.context.get("request")
@@ -171,14 +436,33 @@ class CommentReplySerializer(serializers.ModelSerializer):
             ),
         }
 
+    def compile_reply_to(self):
+        # The author URL is resolved once and only its id is filled in per comment.
+        placeholder = "__author__"
+        request = self.context.get("request")
+        url = request.build_absolute_uri(reverse("author-detail", args=[placeholder]))
+
+        def get_reply_to(comment):
+            return {
+                "username": comment.reply_to.user.username,
+                "url": url.replace(placeholder, str(comment.reply_to.id)),
+            }
+
+        return get_reply_to
 
-class CommentSerializer(serializers.ModelSerializer):
+
+class CommentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     author = SimpleAuthorSerializer(read_only=True)
     counts = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = Comment
         fields = ["id", "description", "author", "counts"]
+        expandable_fields = {
+            "reply_to": SimpleAuthorSerializer(read_only=True),
+        }
+        field_dependencies = {"counts": ["replies_count"]}
+        list_serializer_class = CompiledListSerializer
 
     def create(self, validated_data):
         validated_data["author"] = self.context["request"].user.author
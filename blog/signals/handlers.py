@@ -1,7 +1,33 @@
 from django.dispatch import receiver
+from django.core.cache import cache
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
-from blog.models import Author
+from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from blog.models import (
+    Author,
+    Category,
+    CategoryCounter,
+    Article,
+    ArticleImage,
+    ArticleLike,
+    Comment,
+)
+from blog.constants import CacheKeys, CacheTags
+from blog.caching import invalidate_tags
+from blog.utils import generate_unique_slug
+from blog.tasks import generate_image_variants
+from blog.images import delete_image_variants
+from blog.search import update_search_vectors
+from blog import likes
+from blog.counters import (
+    adjust_category_articles_count,
+    move_category_subtree_articles_count,
+    adjust_article_counter,
+    add_comment_reply,
+    remove_comment_reply,
+)
 
 User = get_user_model()
 
@@ -10,3 +36,267 @@ User = get_user_model()
 def create_author_for_new_user(sender, **kwargs):
     if kwargs["created"]:
         Author.objects.create(user=kwargs["instance"])
+
+
+@receiver(pre_save, sender=Category)
+def set_category_slug(sender, instance, **kwargs):
+    instance.slug = generate_unique_slug(instance, instance.title)
+
+
+@receiver(pre_save, sender=Article)
+def set_article_slug(sender, instance, **kwargs):
+    instance.slug = generate_unique_slug(instance, instance.heading)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+def invalidate_category_hierarchy(sender, **kwargs):
+    transaction.on_commit(lambda: cache.delete(CacheKeys.CATEGORY_HIERARCHY))
+
+
+@receiver(post_save, sender=Category)
+def update_category_path(sender, instance, **kwargs):
+    update_fields = kwargs["update_fields"]
+    if update_fields is not None and "parent" not in update_fields:
+        return
+
+    paths = dict(
+        Category.objects.filter(pk__in=[instance.pk, instance.parent_id]).values_list(
+            "pk", "path"
+        )
+    )
+    old_path = paths[instance.pk]
+    parent_path = paths.get(instance.parent_id, "")
+    new_path = f"{parent_path}{instance.pk}{Category.PATH_SEPARATOR}"
+
+    if new_path != old_path:
+        if old_path:
+            Category.objects.filter(path__startswith=old_path).update(
+                path=Concat(Value(new_path), Substr("path", len(old_path) + 1))
+            )
+            move_category_subtree_articles_count(instance.pk, old_path, new_path)
+        else:
+            Category.objects.filter(pk=instance.pk).update(path=new_path)
+
+    instance.path = new_path
+
+
+@receiver(post_delete, sender=Category)
+def reroot_category_descendants(sender, instance, **kwargs):
+    if instance.path:
+        Category.objects.filter(path__startswith=instance.path).update(
+            path=Substr("path", len(instance.path) + 1)
+        )
+
+
+@receiver(post_save, sender=Category)
+def create_counter_for_new_category(sender, **kwargs):
+    if kwargs["created"]:
+        CategoryCounter.objects.create(category=kwargs["instance"])
+
+
+@receiver(pre_delete, sender=Category)
+def subtract_deleted_category_articles_count(sender, instance, **kwargs):
+    move_category_subtree_articles_count(instance.pk, instance.path, "")
+
+
+@receiver(pre_save, sender=Article)
+def remember_previous_article_category(sender, instance, **kwargs):
+    instance._previous_category_id = (
+        Article.objects.filter(pk=instance.pk)
+        .values_list("category_id", flat=True)
+        .first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=Article)
+def update_category_articles_count(sender, instance, **kwargs):
+    if kwargs["created"]:
+        adjust_category_articles_count(instance.category_id, 1)
+    elif instance._previous_category_id != instance.category_id:
+        adjust_category_articles_count(instance._previous_category_id, -1)
+        adjust_category_articles_count(instance.category_id, 1)
+
+
+@receiver(post_delete, sender=Article)
+def decrease_category_articles_count(sender, instance, **kwargs):
+    adjust_category_articles_count(instance.category_id, -1)
+
+
+@receiver(post_delete, sender=Article)
+def discard_buffered_likers(sender, instance, **kwargs):
+    if likes.is_enabled():
+        article_id = instance.pk
+        transaction.on_commit(lambda: likes.discard_likers(article_id))
+
+
+@receiver(post_save, sender=ArticleLike)
+def increase_article_likes_count(sender, instance, **kwargs):
+    if kwargs["created"]:
+        adjust_article_counter(instance.article_id, "likes_count", 1)
+
+
+@receiver(post_delete, sender=ArticleLike)
+def decrease_article_likes_count(sender, instance, **kwargs):
+    # Flushing buffered unlikes recounts the likes afterwards.
+    if not isinstance(kwargs["origin"], Article) and not likes.recounting.get():
+        adjust_article_counter(instance.article_id, "likes_count", -1)
+
+
+@receiver(post_save, sender=Comment)
+def increase_article_comments_count(sender, instance, **kwargs):
+    if kwargs["created"]:
+        adjust_article_counter(instance.article_id, "comments_count", 1)
+
+
+@receiver(post_delete, sender=Comment)
+def decrease_article_comments_count(sender, instance, **kwargs):
+    if not isinstance(kwargs["origin"], Article):
+        adjust_article_counter(instance.article_id, "comments_count", -1)
+
+
+@receiver(post_save, sender=Comment)
+def increase_parent_replies_count(sender, instance, **kwargs):
+    if kwargs["created"] and instance.parent_id is not None:
+        add_comment_reply(instance.parent_id, instance.created_at)
+
+
+@receiver(post_delete, sender=Comment)
+def decrease_parent_replies_count(sender, instance, **kwargs):
+    if instance.parent_id is not None and not isinstance(kwargs["origin"], Article):
+        remove_comment_reply(instance.parent_id)
+
+
+@receiver(post_save, sender=Article)
+def update_article_search_vector(sender, instance, **kwargs):
+    update_search_vectors(Article.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Category)
+def update_category_articles_search_vectors(sender, instance, **kwargs):
+    update_fields = kwargs["update_fields"]
+    if kwargs["created"] or (
+        update_fields is not None and "title" not in update_fields
+    ):
+        return
+    update_search_vectors(Article.objects.filter(category_id=instance.pk))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_responses(sender, instance, **kwargs):
+    invalidate_tags(CacheTags.ALL_CATEGORIES, CacheTags.ALL_ARTICLES)
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+def invalidate_article_responses(sender, instance, **kwargs):
+    invalidate_tags(
+        CacheTags.article(instance.pk),
+        CacheTags.ALL_ARTICLES,
+        CacheTags.ALL_CATEGORIES,
+    )
+
+
+@receiver(post_save, sender=ArticleImage)
+@receiver(post_delete, sender=ArticleImage)
+@receiver(post_save, sender=ArticleLike)
+@receiver(post_delete, sender=ArticleLike)
+def invalidate_article_relation_responses(sender, instance, **kwargs):
+    invalidate_tags(CacheTags.article(instance.article_id), CacheTags.ALL_ARTICLES)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_responses(sender, instance, **kwargs):
+    invalidate_tags(
+        CacheTags.article_comments(instance.article_id),
+        CacheTags.article(instance.article_id),
+        CacheTags.ALL_ARTICLES,
+    )
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def invalidate_author_responses(sender, instance, **kwargs):
+    invalidate_tags(CacheTags.ALL_AUTHORS)
+
+
+@receiver(post_save, sender=User)
+def invalidate_username_responses(sender, instance, **kwargs):
+    update_fields = kwargs["update_fields"]
+    if update_fields is None or "username" in update_fields:
+        invalidate_tags(CacheTags.ALL_AUTHORS)
+
+
+@receiver(pre_save, sender=ArticleImage)
+def reset_article_image_variants(sender, instance, **kwargs):
+    reset_image_variants(instance, "image", "variants", kwargs["update_fields"])
+
+
+@receiver(pre_save, sender=Author)
+def reset_avatar_variants(sender, instance, **kwargs):
+    reset_image_variants(instance, "avatar", "avatar_variants", kwargs["update_fields"])
+
+
+@receiver(post_delete, sender=ArticleImage)
+def delete_article_image_variants(sender, instance, **kwargs):
+    delete_image_variants_on_commit(instance, "image", instance.variants)
+
+
+@receiver(post_delete, sender=Author)
+def delete_avatar_variants(sender, instance, **kwargs):
+    delete_image_variants_on_commit(instance, "avatar", instance.avatar_variants)
+
+
+@receiver(post_save, sender=ArticleImage)
+def schedule_article_image_variants(sender, instance, **kwargs):
+    schedule_image_variants(instance, "image", "variants")
+
+
+@receiver(post_save, sender=Author)
+def schedule_avatar_variants(sender, instance, **kwargs):
+    schedule_image_variants(instance, "avatar", "avatar_variants")
+
+
+def reset_image_variants(instance, image_field, variants_field, update_fields):
+    instance._image_changed = False
+    if update_fields is not None and image_field not in update_fields:
+        return
+
+    stored = (
+        instance.__class__.objects.filter(pk=instance.pk)
+        .values_list(image_field, variants_field)
+        .first()
+        if instance.pk
+        else None
+    )
+    (stored_name, stored_variants) = stored or (None, None)
+    image_file = getattr(instance, image_field)
+    if (image_file.name or None) != (stored_name or None):
+        instance._image_changed = True
+        setattr(instance, variants_field, None)
+        delete_image_variants_on_commit(instance, image_field, stored_variants)
+
+
+def delete_image_variants_on_commit(instance, image_field, variants):
+    if variants:
+        storage = instance._meta.get_field(image_field).storage
+        transaction.on_commit(lambda: delete_image_variants(storage, variants))
+
+
+def schedule_image_variants(instance, image_field, variants_field):
+    if not (
+        getattr(instance, "_image_changed", False) and getattr(instance, image_field)
+    ):
+        return
+
+    transaction.on_commit(
+        lambda: generate_image_variants.delay(
+            instance._meta.label, instance.pk, image_field, variants_field
+        )
+    )
@@ -0,0 +1,62 @@
+from celery import shared_task
+from PIL import UnidentifiedImageError
+
+from django.apps import apps
+from django.db import transaction
+
+from .images import create_image_variants, delete_image_variants
+from .counters import repair_article_counters as _repair_article_counters
+from .likes import flush as flush_likes
+from .trending import refresh_trending_articles as _refresh_trending_articles
+
+
+@shared_task
+def repair_article_counters():
+    return _repair_article_counters()
+
+
+@shared_task
+def refresh_trending_articles():
+    return _refresh_trending_articles()
+
+
+@shared_task
+def flush_buffered_likes():
+    return flush_likes()
+
+
+@shared_task(autoretry_for=(OSError,), retry_backoff=True, max_retries=3)
+def generate_image_variants(model_label, pk, image_field, variants_field):
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).only(image_field).first()
+    if instance is None:
+        return
+
+    image_file = getattr(instance, image_field)
+    if not image_file:
+        return
+
+    try:
+        variants = create_image_variants(image_file)
+    except UnidentifiedImageError:
+        # A corrupt upload fails the same way on every retry.
+        return
+
+    with transaction.atomic():
+        instance = (
+            model.objects.select_for_update()
+            .filter(pk=pk, **{image_field: image_file.name})
+            .first()
+        )
+        if instance is None:
+            # The image was replaced or deleted while its variants were rendered.
+            delete_image_variants(image_file.storage, variants)
+            return
+
+        replaced = getattr(instance, variants_field)
+        setattr(instance, variants_field, variants)
+        # Saving sends the signals that invalidate the responses showing the image.
+        instance.save(update_fields=[variants_field])
+        transaction.on_commit(
+            lambda: delete_image_variants(image_file.storage, replaced)
+        )
@@ -1,3 +1,1253 @@
-from django.test import TestCase
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from datetime import timedelta
 
-# Create your tests here.
+import pytest
+from PIL import Image
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.functions import Coalesce
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from blog.models import (
+    Article,
+    ArticleImage,
+    ArticleLike,
+    Category,
+    CategoryCounter,
+    Comment,
+    TrendingArticle,
+)
+from blog import likes
+from blog.pagination import KeysetPagination
+from blog.serializers import CompiledListSerializer
+from blog.caching import get_or_compute, invalidate_tags
+from blog.images import create_image_variants
+from blog.tasks import generate_image_variants
+from blog.counters import (
+    path_to_ids,
+    reconcile_category_counters,
+    repair_article_counters,
+)
+from blog.threads import (
+    assemble_threads,
+    get_reply_ids,
+    get_reply_ids_by_level,
+    get_reply_ids_query,
+    get_reply_ids_with_cte,
+)
+from blog.trending import refresh_trending_articles
+from blog.utils import generate_unique_slug
+from users.models import User
+
+SIZES = [1, 4, 12]
+
+IMAGE_VARIANTS = {
+    "webp": [{"name": "blog/articles/image-320w.webp", "width": 320, "height": 240}],
+}
+
+
+def seed_blog(size, staff_user):
+    """
+    Creates `size` authors, articles and categories below a root category. Every article has an image, a like
+    from every author and a reply chain under a comment of every author.
+    """
+    authors = [staff_user.author] + [
+        User.objects.create_user(email=f"author{index}@scribbly.com").author
+        for index in range(size)
+    ]
+
+    categories = [Category.objects.create(title="Category")]
+    for index in range(size):
+        categories.append(
+            Category.objects.create(
+                title=f"Category {index}", parent=categories[index // 2]
+            )
+        )
+
+    articles = []
+    for index in range(size):
+        article = Article.objects.create(
+            heading=f"Article {index}",
+            summary="Summary",
+            label="Label",
+            category=categories[index + 1],
+        )
+        ArticleImage.objects.create(
+            article=article, image="blog/articles/image.jpg", variants=IMAGE_VARIANTS
+        )
+        for author in authors:
+            ArticleLike.objects.create(article=article, author=author)
+            comment = Comment.objects.create(
+                article=article, author=author, description="Comment"
+            )
+            reply = Comment.objects.create(
+                article=article,
+                author=staff_user.author,
+                parent=comment,
+                reply_to=author,
+                description="Reply",
+            )
+            Comment.objects.create(
+                article=article,
+                author=author,
+                parent=reply,
+                reply_to=staff_user.author,
+                description="Reply",
+            )
+        articles.append(article)
+
+    refresh_trending_articles()
+    return articles
+
+
+def get_routes(article):
+    category = article.category
+    root = Category.objects.get(parent=None)
+    comment = Comment.objects.filter(article=article, parent=None).first()
+    image = article.images.first()
+    article_kwargs = {"article_pk": article.pk}
+
+    return [
+        (reverse("author-list"), 1),
+        (reverse("author-detail", args=[article.likes.first().author_id]), 1),
+        (reverse("author-me"), 1),
+        (reverse("category-list"), 3),
+        (reverse("category-detail", args=[category.pk]), 2),
+        (reverse("category-by-slug", args=[category.slug]), 2),
+        (reverse("category-hierarchical"), 2),
+        (reverse("category-descendants", args=[root.pk]), 5),
+        (reverse("category-ancestors", args=[category.pk]), 4),
+        (reverse("article-list"), 3),
+        (reverse("article-list") + "?cursor=", 2),
+        (reverse("article-list") + "?cursor=&expand=category", 3),
+        (reverse("article-detail", args=[article.pk]), 2),
+        (reverse("article-by-slug", args=[article.slug]), 2),
+        (reverse("article-trending"), 3),
+        (reverse("article-search") + "?q=Article", 3),
+        (reverse("article-liked-by-me") + f"?ids={article.pk}", 1),
+        (reverse("article-images-list", kwargs=article_kwargs), 2),
+        (
+            reverse("article-images-detail", kwargs={**article_kwargs, "pk": image.pk}),
+            1,
+        ),
+        (reverse("article-likes-list", kwargs=article_kwargs), 2),
+        (reverse("article-likes-list", kwargs=article_kwargs) + "?cursor=", 1),
+        (reverse("article-comments-list", kwargs=article_kwargs), 2),
+        (reverse("article-comments-list", kwargs=article_kwargs) + "?cursor=", 1),
+        (
+            reverse("article-comments-list", kwargs=article_kwargs)
+            + "?cursor=&expand=reply_to",
+            1,
+        ),
+        (
+            reverse(
+                "article-comments-detail", kwargs={**article_kwargs, "pk": comment.pk}
+            ),
+            1,
+        ),
+        (
+            reverse(
+                "article-comments-replies",
+                kwargs={**article_kwargs, "pk": comment.pk},
+            )
+            + "?cursor=",
+            1,
+        ),
+        (reverse("article-comments-thread", kwargs=article_kwargs), 4),
+        (reverse("article-comments-thread", kwargs=article_kwargs) + "?cursor=", 3),
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("size", SIZES)
+def test_query_budgets_do_not_grow_with_rows(size, staff_user, assert_query_budget):
+    articles = seed_blog(size, staff_user)
+
+    for url, budget in get_routes(articles[-1]):
+        assert_query_budget(url, budget)
+
+
+HOT_QUERIES = [
+    "articles",
+    "article_by_slug",
+    "trending_articles",
+    "category_descendants",
+    "comments_by_activity",
+    "comment_replies",
+    "article_likes",
+    "article_like_by_author",
+    "articles_after_cursor",
+    "comments_by_activity_after_cursor",
+    "article_likes_after_cursor",
+    "users_after_cursor",
+]
+
+# The leading column of every cursor must bound the index scan of its seek.
+SEEK_INDEX_CONDITIONS = {
+    "articles_after_cursor": "created_at",
+    "comments_by_activity_after_cursor": "COALESCE",
+    "article_likes_after_cursor": "created_at",
+    "users_after_cursor": "date_joined",
+}
+
+
+def seek(queryset, ordering):
+    """Returns the page of a keyset cursor pointing at the middle row of `queryset`."""
+    rows = list(queryset.order_by(*ordering))
+    row = rows[len(rows) // 2]
+    values = [getattr(row, field.lstrip("-")) for field in ordering]
+    seek_filter = KeysetPagination().get_seek_filter(ordering, values)
+    return queryset.filter(seek_filter).order_by(*ordering)[:11]
+
+
+def get_hot_queries():
+    reply = Comment.objects.filter(parent__isnull=False).first()
+    like = ArticleLike.objects.first()
+    category = Category.objects.exclude(parent=None).first()
+
+    return {
+        "articles": Article.objects.order_by("-created_at", "-id")[:11],
+        "article_by_slug": Article.objects.filter(slug=reply.article.slug),
+        "trending_articles": TrendingArticle.objects.order_by("-score")[:10],
+        "category_descendants": Category.objects.filter(
+            path__startswith=category.path
+        ).exclude(pk=category.pk),
+        "comments_by_activity": Comment.objects.filter(
+            article_id=reply.article_id, parent=None
+        )
+        .annotate(last_activity_at=Coalesce("last_reply_at", "created_at"))
+        .order_by("-last_activity_at", "-id")[:11],
+        "comment_replies": Comment.objects.filter(
+            article_id=reply.article_id, parent=reply.parent_id
+        ).order_by("created_at", "id")[:11],
+        "article_likes": ArticleLike.objects.filter(
+            article_id=like.article_id
+        ).order_by("-created_at", "-id")[:11],
+        "article_like_by_author": ArticleLike.objects.filter(
+            article_id=like.article_id, author_id=like.author_id
+        ),
+        "articles_after_cursor": seek(Article.objects.all(), ("-created_at", "-id")),
+        "comments_by_activity_after_cursor": seek(
+            Comment.objects.filter(article_id=reply.article_id, parent=None).annotate(
+                last_activity_at=Coalesce("last_reply_at", "created_at")
+            ),
+            ("-last_activity_at", "-id"),
+        ),
+        "article_likes_after_cursor": seek(
+            ArticleLike.objects.filter(article_id=like.article_id),
+            ("-created_at", "-id"),
+        ),
+        "users_after_cursor": seek(User.objects.all(), ("-date_joined", "-id")),
+    }
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_queries_use_indexes(name, assert_uses_indexes, benchmark_data):
+    assert_uses_indexes(get_hot_queries()[name], SEEK_INDEX_CONDITIONS.get(name))
+
+
+def get_path(category):
+    return Category.objects.values_list("path", flat=True).get(pk=category.pk)
+
+
+@pytest.mark.django_db
+def test_category_paths_follow_reparenting():
+    root = Category.objects.create(title="Root")
+    child = Category.objects.create(title="Child", parent=root)
+    grandchild = Category.objects.create(title="Grandchild", parent=child)
+    assert get_path(grandchild) == f"{root.pk}/{child.pk}/{grandchild.pk}/"
+    assert grandchild.ancestor_ids == [root.pk, child.pk]
+
+    other_root = Category.objects.create(title="Other root")
+    child.parent = other_root
+    child.save()
+
+    assert get_path(child) == f"{other_root.pk}/{child.pk}/"
+    assert get_path(grandchild) == f"{other_root.pk}/{child.pk}/{grandchild.pk}/"
+    assert get_path(root) == f"{root.pk}/"
+
+    child.parent = None
+    child.save(update_fields=["parent"])
+    assert get_path(grandchild) == f"{child.pk}/{grandchild.pk}/"
+
+
+@pytest.mark.django_db
+def test_deleting_a_category_reroots_its_descendants():
+    root = Category.objects.create(title="Root")
+    child = Category.objects.create(title="Child", parent=root)
+    grandchild = Category.objects.create(title="Grandchild", parent=child)
+
+    root.delete()
+
+    assert get_path(child) == f"{child.pk}/"
+    assert get_path(grandchild) == f"{child.pk}/{grandchild.pk}/"
+    assert list(
+        Category.objects.filter(path__startswith=get_path(child)).order_by("pk")
+    ) == [child, grandchild]
+
+
+def get_counts(category):
+    counter = CategoryCounter.objects.get(pk=category.pk)
+    return (counter.articles_count, counter.subtree_articles_count)
+
+
+@pytest.mark.django_db
+def test_category_counters_follow_articles_and_subtrees():
+    root = Category.objects.create(title="Root")
+    child = Category.objects.create(title="Child", parent=root)
+    other_root = Category.objects.create(title="Other root")
+
+    article = Article.objects.create(heading="Article", category=child)
+    Article.objects.create(heading="Other article", category=root)
+    assert get_counts(root) == (1, 2)
+    assert get_counts(child) == (1, 1)
+
+    article.category = other_root
+    article.save()
+    assert get_counts(root) == (1, 1)
+    assert get_counts(child) == (0, 0)
+    assert get_counts(other_root) == (1, 1)
+
+    Article.objects.create(heading="Third article", category=child)
+    child.parent = other_root
+    child.save()
+    assert get_counts(root) == (1, 1)
+    assert get_counts(other_root) == (1, 2)
+
+    article.delete()
+    assert get_counts(other_root) == (0, 1)
+
+
+@pytest.mark.django_db
+def test_reconcile_category_counters_repairs_drift():
+    root = Category.objects.create(title="Root")
+    child = Category.objects.create(title="Child", parent=root)
+    Article.objects.create(heading="Article", category=child)
+    CategoryCounter.objects.update(articles_count=7, subtree_articles_count=7)
+    CategoryCounter.objects.filter(pk=child.pk).delete()
+
+    assert reconcile_category_counters() == 2
+    assert get_counts(root) == (0, 1)
+    assert get_counts(child) == (1, 1)
+    assert reconcile_category_counters() == 0
+
+
+def get_article_counts(article):
+    return tuple(
+        Article.objects.filter(pk=article.pk).values_list(
+            "likes_count", "comments_count"
+        )[0]
+    )
+
+
+@pytest.mark.django_db
+def test_article_counters_follow_likes_and_comments(staff_user):
+    article = Article.objects.create(heading="Article")
+    author = User.objects.create_user(email="author@scribbly.com").author
+
+    like = ArticleLike.objects.create(article=article, author=staff_user.author)
+    ArticleLike.objects.create(article=article, author=author)
+    comment = Comment.objects.create(
+        article=article, author=author, description="Comment"
+    )
+    Comment.objects.create(
+        article=article, author=author, parent=comment, description="Reply"
+    )
+    assert get_article_counts(article) == (2, 2)
+
+    like.delete()
+    comment.delete()
+    assert get_article_counts(article) == (1, 0)
+
+
+@pytest.mark.django_db
+def test_repair_article_counters_fixes_only_drifted_articles(staff_user):
+    articles = [Article.objects.create(heading=f"Article {i}") for i in range(3)]
+    for article in articles:
+        ArticleLike.objects.create(article=article, author=staff_user.author)
+    Article.objects.filter(pk=articles[0].pk).update(likes_count=5, comments_count=3)
+
+    assert repair_article_counters(batch_size=2) == 1
+    assert [get_article_counts(article) for article in articles] == [(1, 0)] * 3
+    assert repair_article_counters() == 0
+
+
+def get_ids(response):
+    return [item["id"] for item in response.data["results"]]
+
+
+@pytest.mark.django_db
+def test_cursor_pages_are_stable_while_rows_are_added(api_client):
+    articles = [Article.objects.create(heading=f"Article {i}") for i in range(7)]
+
+    response = api_client.get(reverse("article-list") + "?cursor=&limit=3")
+    assert "count" not in response.data
+    assert response.data["previous"] is None
+    seen = get_ids(response)
+
+    # Newer articles sort first, they must not shift the pages that follow.
+    for index in range(3):
+        Article.objects.create(heading=f"New article {index}")
+
+    while response.data["next"]:
+        previous_page = response
+        response = api_client.get(response.data["next"])
+        seen += get_ids(response)
+    assert seen == [article.pk for article in reversed(articles)]
+
+    previous = api_client.get(response.data["previous"])
+    assert get_ids(previous) == get_ids(previous_page)
+
+    counted = api_client.get(reverse("article-list") + "?cursor=&count=true")
+    assert counted.data["count"] == 10
+
+
+@pytest.mark.django_db
+def test_offset_pagination_stays_the_default(api_client):
+    articles = [Article.objects.create(heading=f"Article {i}") for i in range(3)]
+
+    response = api_client.get(reverse("article-list") + "?limit=2&offset=1")
+
+    assert response.data["count"] == 3
+    assert get_ids(response) == [articles[1].pk, articles[0].pk]
+
+
+@pytest.mark.django_db
+def test_invalid_cursor_is_not_found(api_client):
+    response = api_client.get(reverse("article-list") + "?cursor=invalid")
+    assert response.status_code == 404
+
+
+def search(client, text, query=""):
+    return client.get(reverse("article-search") + f"?q={text}{query}")
+
+
+@pytest.fixture(params=["full_text", "fallback"])
+def search_backend(request, monkeypatch):
+    if request.param == "fallback":
+        monkeypatch.setattr("blog.search.is_full_text_search_supported", lambda: False)
+    return request.param
+
+
+@pytest.mark.django_db
+def test_search_ranks_headings_first_and_paginates(api_client, search_backend):
+    category = Category.objects.create(title="Gardening")
+    in_category = Article.objects.create(heading="Roses", category=category)
+    in_summary = Article.objects.create(heading="Tulips", summary="Gardening tips")
+    in_heading = Article.objects.create(heading="Gardening for beginners")
+    Article.objects.create(heading="Cooking")
+
+    response = search(api_client, "gardening")
+    assert response.data["count"] == 3
+    assert get_ids(response) == [in_heading.pk, in_summary.pk, in_category.pk]
+
+    response = search(api_client, "gardening", "&limit=1&offset=1")
+    assert get_ids(response) == [in_summary.pk]
+    assert response.data["next"] and response.data["previous"]
+
+
+@pytest.mark.django_db
+def test_search_headlines_escape_article_text(api_client, search_backend):
+    Article.objects.create(heading="<script>alert(1)</script> gardening & more")
+
+    (result,) = search(api_client, "gardening").data["results"]
+
+    assert "<script>" not in result["headline"]
+    assert "&lt;script&gt;alert(1)&lt;/script&gt;" in result["headline"]
+    assert "&amp; more" in result["headline"]
+    if search_backend == "full_text" and connection.vendor == "postgresql":
+        assert "<mark>gardening</mark>" in result["headline"]
+
+
+@pytest.mark.django_db
+def test_search_requires_a_query(api_client):
+    assert search(api_client, "").status_code == 400
+
+
+def count_queries(client, url):
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+    assert response.status_code == 200
+    return (response, len(context))
+
+
+@pytest.mark.django_db
+def test_cached_responses_are_invalidated_by_their_tags(
+    api_client, staff_user, django_capture_on_commit_callbacks
+):
+    article = Article.objects.create(heading="Article")
+    other_article = Article.objects.create(heading="Other article")
+    url = reverse("article-detail", args=[article.pk])
+    other_url = reverse("article-detail", args=[other_article.pk])
+    comments_url = reverse("article-comments-list", kwargs={"article_pk": article.pk})
+    for cached_url in [url, other_url, comments_url]:
+        api_client.get(cached_url)
+
+    (response, queries) = count_queries(api_client, url)
+    assert queries == 0
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Comment.objects.create(article=article, author=staff_user.author)
+
+    (response, queries) = count_queries(api_client, url)
+    assert queries > 0
+    assert response.data["counts"]["comments"] == 1
+    (response, queries) = count_queries(api_client, comments_url)
+    assert queries > 0
+    assert len(response.data["results"]) == 1
+    assert count_queries(api_client, other_url)[1] == 0
+
+    with django_capture_on_commit_callbacks(execute=True):
+        article.heading = "Renamed"
+        article.save()
+    assert api_client.get(url).data["heading"] == "Renamed"
+
+
+@pytest.mark.django_db
+def test_stale_entry_is_served_while_another_request_recomputes(
+    django_capture_on_commit_callbacks,
+):
+    computed = []
+
+    def compute():
+        computed.append(True)
+        return len(computed)
+
+    assert get_or_compute("key", ["tag"], compute, timeout=60) == 1
+    assert get_or_compute("key", ["tag"], compute, timeout=60) == 1
+
+    with django_capture_on_commit_callbacks(execute=True):
+        invalidate_tags("tag")
+    cache.add("key:lock", True)
+    assert get_or_compute("key", ["tag"], compute, timeout=60) == 1
+    assert len(computed) == 1
+
+    cache.delete("key:lock")
+    assert get_or_compute("key", ["tag"], compute, timeout=60) == 2
+
+
+@pytest.mark.django_db
+def test_slugs_get_the_next_free_suffix():
+    articles = [Article.objects.create(heading="Hello World") for _ in range(3)]
+    assert [article.slug for article in articles] == [
+        "hello-world",
+        "hello-world-2",
+        "hello-world-3",
+    ]
+
+    articles[1].summary = "Summary"
+    articles[1].save()
+    assert articles[1].slug == "hello-world-2"
+
+    articles[0].heading = "Goodbye"
+    articles[0].save()
+    assert articles[0].slug == "goodbye"
+    assert Article.objects.create(heading="Hello World").slug == "hello-world"
+
+
+@pytest.mark.django_db
+def test_slug_taken_by_a_concurrent_save_is_retried(monkeypatch):
+    Category.objects.create(title="Hello")
+    checked = []
+
+    def generate_stale_slug(instance, value):
+        # The first check ran before the other category was committed.
+        if not checked:
+            checked.append(True)
+            return "hello"
+        return generate_unique_slug(instance, value)
+
+    monkeypatch.setattr(
+        "blog.signals.handlers.generate_unique_slug", generate_stale_slug
+    )
+
+    category = Category.objects.create(title="Hello")
+    assert category.slug == "hello-2"
+    assert Category.objects.filter(title="Hello").count() == 2
+
+
+@pytest.mark.django_db
+def test_by_slug_routes(api_client):
+    category = Category.objects.create(title="Travel Guides")
+    article = Article.objects.create(heading="Visiting Rome", category=category)
+
+    response = api_client.get(reverse("article-by-slug", args=["visiting-rome"]))
+    assert response.data["id"] == article.pk
+    response = api_client.get(reverse("category-by-slug", args=["travel-guides"]))
+    assert response.data["id"] == category.pk
+    response = api_client.get(reverse("article-by-slug", args=["unknown"]))
+    assert response.status_code == 404
+
+
+def get_upload(name="photo.png", size=(800, 600)):
+    buffer = BytesIO()
+    Image.new("RGB", size, "teal").save(buffer, format="PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+def get_variant_names(variants):
+    return [
+        variant["name"] for renditions in variants.values() for variant in renditions
+    ]
+
+
+@pytest.mark.django_db
+def test_image_variants_are_rendered_and_invalidate_responses(
+    api_client, django_capture_on_commit_callbacks
+):
+    article = Article.objects.create(heading="Article")
+    url = reverse("article-detail", args=[article.pk])
+    # The variants are rendered below, once the response hiding the image is cached.
+    with django_capture_on_commit_callbacks():
+        image = ArticleImage.objects.create(article=article, image=get_upload())
+    assert api_client.get(url).data["images"] == []
+
+    with django_capture_on_commit_callbacks(execute=True):
+        generate_image_variants.delay(
+            "blog.ArticleImage", image.pk, "image", "variants"
+        )
+
+    image.refresh_from_db()
+    assert {
+        extension: [variant["width"] for variant in renditions]
+        for extension, renditions in image.variants.items()
+    } == {"webp": [320, 640], "jpeg": [320, 640]}
+    assert all(
+        default_storage.exists(name) for name in get_variant_names(image.variants)
+    )
+    assert [item["id"] for item in api_client.get(url).data["images"]] == [image.pk]
+
+
+@pytest.mark.django_db
+def test_replaced_and_deleted_image_variants_are_removed(
+    django_capture_on_commit_callbacks,
+):
+    article = Article.objects.create(heading="Article")
+    with django_capture_on_commit_callbacks(execute=True):
+        image = ArticleImage.objects.create(article=article, image=get_upload())
+    image.refresh_from_db()
+    first_names = get_variant_names(image.variants)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        image.image = get_upload("other.png", size=(400, 300))
+        image.save()
+    image.refresh_from_db()
+    assert not any(default_storage.exists(name) for name in first_names)
+    second_names = get_variant_names(image.variants)
+    assert all(default_storage.exists(name) for name in second_names)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        image.delete()
+    assert not any(default_storage.exists(name) for name in second_names)
+
+
+@pytest.mark.django_db
+def test_corrupt_images_are_not_retried(
+    monkeypatch, django_capture_on_commit_callbacks
+):
+    calls = []
+
+    def count_calls(image_file):
+        calls.append(image_file.name)
+        return create_image_variants(image_file)
+
+    monkeypatch.setattr("blog.tasks.create_image_variants", count_calls)
+    article = Article.objects.create(heading="Article")
+    upload = SimpleUploadedFile("broken.png", b"not an image", content_type="image/png")
+
+    with django_capture_on_commit_callbacks(execute=True):
+        image = ArticleImage.objects.create(article=article, image=upload)
+
+    image.refresh_from_db()
+    assert image.variants is None
+    assert len(calls) == 1
+
+
+def capture_sql(client, url):
+    cache.clear()
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+    assert response.status_code == 200
+    return (response, [query["sql"] for query in context.captured_queries])
+
+
+@pytest.mark.django_db
+def test_sparse_fieldsets_prune_article_queries(api_client):
+    category = Category.objects.create(title="Category")
+    article = Article.objects.create(heading="Article", category=category)
+    ArticleImage.objects.create(
+        article=article, image="blog/articles/image.jpg", variants=IMAGE_VARIANTS
+    )
+    url = reverse("article-list") + "?cursor="
+
+    (response, queries) = capture_sql(api_client, url)
+    assert "EXISTS" in queries[0]
+    assert "blog_articleimage" in queries[1]
+
+    (response, queries) = capture_sql(api_client, url + "&fields=id,heading")
+    assert list(response.data["results"][0]) == ["id", "heading"]
+    (query,) = queries
+    for pruned in ["EXISTS", "JOIN", "likes_count", "summary"]:
+        assert pruned not in query
+
+    (response, queries) = capture_sql(api_client, url + "&fields=id&expand=category")
+    assert list(response.data["results"][0]) == ["id", "category"]
+    assert 'JOIN "blog_category"' in queries[0]
+    assert not any("blog_articleimage" in query for query in queries)
+
+
+@pytest.mark.django_db
+def test_sparse_fieldsets_prune_comment_and_author_queries(api_client, staff_user):
+    article = Article.objects.create(heading="Article")
+    Comment.objects.create(article=article, author=staff_user.author)
+    url = reverse("article-comments-list", kwargs={"article_pk": article.pk})
+
+    (_, queries) = capture_sql(api_client, url + "?cursor=")
+    assert 'JOIN "blog_author"' in queries[0]
+    assert '"replies_count"' in queries[0]
+
+    (response, queries) = capture_sql(api_client, url + "?cursor=&fields=id")
+    assert list(response.data["results"][0]) == ["id"]
+    assert "JOIN" not in queries[0]
+    assert '"replies_count"' not in queries[0]
+
+    (_, queries) = capture_sql(api_client, reverse("author-list"))
+    assert 'JOIN "users_user"' in queries[0]
+    (response, queries) = capture_sql(api_client, reverse("author-list") + "?fields=id")
+    assert list(response.data[0]) == ["id"]
+    assert "JOIN" not in queries[0]
+
+
+@pytest.mark.django_db
+def test_trending_articles_rank_recent_interactions_higher(
+    api_client, staff_user, django_capture_on_commit_callbacks
+):
+    now = timezone.now()
+    authors = [
+        User.objects.create_user(email=f"user{index}@scribbly.com").author
+        for index in range(3)
+    ]
+    (fresh, liked, stale, quiet) = [
+        Article.objects.create(heading=heading)
+        for heading in ["Fresh", "Liked", "Stale", "Quiet"]
+    ]
+    # A comment weighs two likes, the comment an hour old ranks below the new likes.
+    Comment.objects.create(article=fresh, author=authors[0])
+    for author in authors[:2]:
+        ArticleLike.objects.create(article=liked, author=author)
+    old_likes = [ArticleLike.objects.create(article=stale, author=a) for a in authors]
+    ArticleLike.objects.filter(pk=old_likes[0].pk).update(
+        created_at=now - timedelta(days=1)
+    )
+    ArticleLike.objects.filter(pk__in=[like.pk for like in old_likes[1:]]).update(
+        created_at=now - timedelta(days=4)
+    )
+    Comment.objects.filter(article=fresh).update(created_at=now - timedelta(hours=1))
+
+    assert refresh_trending_articles() == 3
+    scores = dict(TrendingArticle.objects.values_list("article", "score"))
+    assert quiet.pk not in scores
+    assert scores[liked.pk] > scores[fresh.pk] > scores[stale.pk]
+
+    assert refresh_trending_articles(size=2) == 2
+    url = reverse("article-trending")
+    ids = [article["id"] for article in api_client.get(url).data["results"]]
+    assert ids == [liked.pk, fresh.pk]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        refresh_trending_articles()
+    ids = [article["id"] for article in api_client.get(url).data["results"]]
+    assert ids == [liked.pk, fresh.pk, stale.pk]
+
+
+@pytest.fixture
+def buffered_likes(settings):
+    if not settings.REDIS_URL:
+        pytest.skip("Buffered likes are only tested with Redis.")
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": settings.REDIS_URL,
+        }
+    }
+    settings.BLOG_BUFFERED_LIKES = True
+    connection = likes.get_connection()
+    try:
+        connection.ping()
+    except RedisConnectionError:
+        pytest.skip("Buffered likes are only tested with Redis.")
+
+    def clear():
+        keys = connection.keys("blog:likes*")
+        if keys:
+            connection.delete(*keys)
+
+    clear()
+    yield connection
+    clear()
+
+
+def get_likes_count(article):
+    article.refresh_from_db(fields=["likes_count"])
+    return article.likes_count
+
+
+@pytest.mark.django_db
+def test_buffered_likes_are_flushed_to_the_database(api_client, buffered_likes):
+    article = Article.objects.create(heading="Article")
+    kwargs = {"article_pk": article.pk}
+    url = reverse("article-likes-list", kwargs=kwargs)
+    dislike_url = reverse("article-likes-dislike", kwargs=kwargs)
+
+    assert api_client.post(url).status_code == 202
+    assert api_client.post(url).status_code == 400
+    missing_url = reverse("article-likes-list", kwargs={"article_pk": article.pk + 1})
+    assert api_client.post(missing_url).status_code == 404
+    assert not ArticleLike.objects.exists()
+
+    # Every request is queued, the repeated like is written as a no-op.
+    assert likes.flush() == 2
+    assert ArticleLike.objects.filter(article=article).count() == 1
+    assert get_likes_count(article) == 1
+
+    assert api_client.delete(dislike_url).status_code == 204
+    assert api_client.delete(dislike_url).status_code == 404
+    assert api_client.post(url).status_code == 202
+    assert api_client.delete(dislike_url).status_code == 204
+    assert likes.flush() == 4
+    assert not ArticleLike.objects.exists()
+    assert get_likes_count(article) == 0
+    assert likes.flush() == 0
+
+
+@pytest.mark.django_db
+def test_liked_by_me_route_answers_buffered_likes_before_they_are_flushed(
+    api_client, buffered_likes
+):
+    (liked, other) = [Article.objects.create(heading=h) for h in ["Liked", "Other"]]
+    url = reverse("article-liked-by-me")
+    params = {"ids": f"{liked.pk},{other.pk}"}
+
+    api_client.post(reverse("article-likes-list", kwargs={"article_pk": liked.pk}))
+    assert not ArticleLike.objects.exists()
+    assert api_client.get(url, params).data == [
+        {"id": liked.pk, "liked_by_me": True},
+        {"id": other.pk, "liked_by_me": False},
+    ]
+
+    api_client.delete(reverse("article-likes-dislike", kwargs={"article_pk": liked.pk}))
+    assert api_client.get(url, params).data[0] == {
+        "id": liked.pk,
+        "liked_by_me": False,
+    }
+
+
+@pytest.mark.django_db
+def test_overlapping_flushes_wait_for_the_running_one(buffered_likes):
+    article = Article.objects.create(heading="Article")
+    likes.like(article.pk, User.objects.create_user(email="a@scribbly.com").author.pk)
+
+    lock = buffered_likes.lock(likes.LOCK_KEY, timeout=10)
+    lock.acquire()
+    assert likes.flush() == 0
+    assert buffered_likes.llen(likes.PENDING_KEY) == 1
+    lock.release()
+
+    assert likes.flush() == 1
+    assert get_likes_count(article) == 1
+
+
+@pytest.mark.django_db
+def test_failed_flush_resumes_from_the_unwritten_chunk(buffered_likes, monkeypatch):
+    article = Article.objects.create(heading="Article")
+    authors = [
+        User.objects.create_user(email=f"user{index}@scribbly.com").author
+        for index in range(3)
+    ]
+    for author in authors:
+        likes.like(article.pk, author.pk)
+    likes.unlike(article.pk, authors[0].pk)
+
+    apply_operations = likes.apply_operations
+    calls = []
+
+    def fail_second_chunk(operations, batch_size):
+        calls.append(operations)
+        if len(calls) == 2:
+            raise RuntimeError("The database went away.")
+        apply_operations(operations, batch_size)
+
+    monkeypatch.setattr(likes, "apply_operations", fail_second_chunk)
+    with pytest.raises(RuntimeError):
+        likes.flush(batch_size=2)
+    # The first chunk was written and removed from the queue, the second was kept.
+    assert ArticleLike.objects.count() == 2
+    assert buffered_likes.llen(likes.PROCESSING_KEY) == 2
+
+    monkeypatch.setattr(likes, "apply_operations", apply_operations)
+    assert likes.flush(batch_size=2) == 2
+    assert set(ArticleLike.objects.values_list("author", flat=True)) == {
+        authors[1].pk,
+        authors[2].pk,
+    }
+    assert get_likes_count(article) == 2
+
+
+@pytest.mark.django_db
+def test_queryset_deletes_of_likes_update_the_likes_count():
+    article = Article.objects.create(heading="Article")
+    for index in range(3):
+        author = User.objects.create_user(email=f"user{index}@scribbly.com").author
+        ArticleLike.objects.create(article=article, author=author)
+
+    ArticleLike.objects.filter(article=article)[:1].get().delete()
+    assert get_likes_count(article) == 2
+    ArticleLike.objects.filter(article=article).delete()
+    assert get_likes_count(article) == 0
+
+
+def get_liked_by_me(client):
+    response = client.get(reverse("article-list") + "?cursor=")
+    return {
+        article["id"]: article["liked_by_me"] for article in response.data["results"]
+    }
+
+
+@pytest.mark.django_db
+def test_liked_by_me_is_scoped_to_the_requesting_user(
+    api_client, staff_user, django_capture_on_commit_callbacks
+):
+    (liked, other) = [Article.objects.create(heading=h) for h in ["Liked", "Other"]]
+    ArticleLike.objects.create(article=liked, author=staff_user.author)
+    user = User.objects.create_user(email="user@scribbly.com")
+    user_client = APIClient()
+    user_client.force_authenticate(user)
+
+    assert get_liked_by_me(api_client) == {liked.pk: True, other.pk: False}
+    assert get_liked_by_me(user_client) == {liked.pk: False, other.pk: False}
+    assert get_liked_by_me(APIClient()) == {liked.pk: False, other.pk: False}
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = user_client.post(
+            reverse("article-likes-list", kwargs={"article_pk": other.pk})
+        )
+    assert response.status_code == 201
+    assert get_liked_by_me(user_client) == {liked.pk: False, other.pk: True}
+    assert get_liked_by_me(api_client) == {liked.pk: True, other.pk: False}
+
+
+@pytest.mark.django_db
+def test_liked_by_me_route_answers_for_the_given_ids(api_client, staff_user):
+    (liked, other) = [Article.objects.create(heading=h) for h in ["Liked", "Other"]]
+    ArticleLike.objects.create(article=liked, author=staff_user.author)
+    url = reverse("article-liked-by-me")
+
+    response = api_client.get(url, {"ids": f"{other.pk},{liked.pk},{other.pk + 100}"})
+    assert response.status_code == 200
+    assert response.data == [
+        {"id": liked.pk, "liked_by_me": True},
+        {"id": other.pk, "liked_by_me": False},
+    ]
+
+    for ids in ["", "1,a", ",".join(str(pk) for pk in range(1, 102))]:
+        assert api_client.get(url, {"ids": ids}).status_code == 400
+    assert APIClient().get(url, {"ids": liked.pk}).status_code == 401
+
+
+def create_thread(author):
+    """
+    Creates two threads and returns their roots and replies by level:
+    root -> 3 replies, the first reply -> 2 replies, the first of those -> 1 reply,
+    other root -> 1 reply.
+    """
+    article = Article.objects.create(heading="Article")
+
+    def reply(parent, count):
+        return [
+            Comment.objects.create(article=article, author=author, parent=parent)
+            for _ in range(count)
+        ]
+
+    roots = reply(None, 2)
+    first_level = reply(roots[0], 3) + reply(roots[1], 1)
+    second_level = reply(first_level[0], 2)
+    third_level = reply(second_level[0], 1)
+    ids = [[comment.pk for comment in level] for level in [first_level, second_level]]
+    return ([root.pk for root in roots], *ids, [third_level[0].pk])
+
+
+@pytest.fixture(params=["cte", "by_level"])
+def reply_ids_query(request):
+    if request.param == "cte":
+        return get_reply_ids_with_cte
+    return get_reply_ids_by_level
+
+
+@pytest.mark.django_db
+def test_reply_ids_keep_shallower_replies_within_the_limits(
+    staff_user, reply_ids_query
+):
+    (root_ids, first, second, third) = create_thread(staff_user.author)
+
+    assert reply_ids_query(root_ids, 10, 500) == first + second + third
+    assert reply_ids_query(root_ids, 2, 500) == first + second
+    assert reply_ids_query(root_ids[1:], 10, 500) == first[3:]
+
+    reply_ids = reply_ids_query(root_ids, 10, 5)
+    assert reply_ids[:4] == first
+    assert reply_ids[4] in second
+
+
+@pytest.mark.django_db
+def test_reply_ids_fall_back_to_a_query_per_level(staff_user, monkeypatch):
+    (root_ids, first, second, third) = create_thread(staff_user.author)
+    assert get_reply_ids(root_ids, 10, 500) == first + second + third
+
+    monkeypatch.setattr("blog.threads.RECURSIVE_CTE_VENDORS", set())
+    with CaptureQueriesContext(connection) as context:
+        assert get_reply_ids(root_ids, 10, 500) == first + second + third
+    # One query per level and a last one that finds no further replies.
+    assert len(context) == 4
+
+    for limits in [(0, 500), (10, 0)]:
+        assert get_reply_ids(root_ids, *limits) == []
+    assert get_reply_ids([], 10, 500) == []
+
+
+@pytest.mark.django_db
+def test_reply_cte_stops_recursing_at_the_size_limit(staff_user):
+    if connection.vendor != "postgresql":
+        pytest.skip("Query plans are only checked on PostgreSQL.")
+    (root_ids, *_) = create_thread(staff_user.author)
+
+    (sql, params) = get_reply_ids_query(root_ids, 10, 2)
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", params)
+        (explained,) = cursor.fetchone()[0]
+    nodes = [explained["Plan"]]
+    for node in nodes:
+        nodes.extend(node.get("Plans", []))
+    (recursion,) = [node for node in nodes if node["Node Type"] == "Recursive Union"]
+    assert recursion["Actual Rows"] == 2
+
+
+def test_assemble_threads_nests_replies_under_their_parents():
+    comments = [
+        SimpleNamespace(id=1, parent_id=None),
+        SimpleNamespace(id=2, parent_id=None),
+        SimpleNamespace(id=3, parent_id=1),
+        SimpleNamespace(id=4, parent_id=3),
+        SimpleNamespace(id=5, parent_id=2),
+        # The parent of a reply beyond the limits is not loaded.
+        SimpleNamespace(id=6, parent_id=7),
+    ]
+    items = [{"id": comment.id} for comment in comments]
+
+    assert assemble_threads(comments, items, [2, 1]) == [
+        {"id": 2, "replies": [{"id": 5, "replies": []}]},
+        {
+            "id": 1,
+            "replies": [{"id": 3, "replies": [{"id": 4, "replies": []}]}],
+        },
+    ]
+
+
+@pytest.mark.django_db
+def test_thread_route_nests_replies_to_the_requested_depth(api_client, staff_user):
+    (root_ids, first, second, third) = create_thread(staff_user.author)
+    article_pk = Comment.objects.get(pk=root_ids[0]).article_id
+    url = reverse("article-comments-thread", kwargs={"article_pk": article_pk})
+
+    def get_tree(depth):
+        response = api_client.get(url, {"depth": depth})
+        return {
+            root["id"]: nest_ids(root["replies"]) for root in response.data["results"]
+        }
+
+    def nest_ids(replies):
+        return {reply["id"]: nest_ids(reply["replies"]) for reply in replies}
+
+    assert get_tree(1) == {
+        root_ids[0]: {pk: {} for pk in first[:3]},
+        root_ids[1]: {first[3]: {}},
+    }
+    assert get_tree(10)[root_ids[0]][first[0]] == {
+        second[0]: {third[0]: {}},
+        second[1]: {},
+    }
+
+
+def get_reply_stats(comment):
+    comment.refresh_from_db(fields=["replies_count", "last_reply_at"])
+    return (comment.replies_count, comment.last_reply_at)
+
+
+@pytest.mark.django_db
+def test_replies_count_and_last_reply_at_follow_replies(api_client, staff_user):
+    article = Article.objects.create(heading="Article")
+
+    def comment(parent=None):
+        return Comment.objects.create(
+            article=article, author=staff_user.author, parent=parent
+        )
+
+    (active, quiet) = [comment(), comment()]
+    assert get_reply_stats(active) == (0, None)
+
+    (first, second) = [comment(active), comment(active)]
+    nested = comment(first)
+    assert get_reply_stats(active) == (2, second.created_at)
+    assert get_reply_stats(first) == (1, nested.created_at)
+
+    url = reverse("article-comments-thread", kwargs={"article_pk": article.pk})
+    ids = [root["id"] for root in api_client.get(url).data["results"]]
+    assert ids == [active.pk, quiet.pk]
+
+    second.delete()
+    assert get_reply_stats(active) == (1, first.created_at)
+    # Deleting a reply deletes its own replies without touching other comments.
+    first.delete()
+    assert get_reply_stats(active) == (0, None)
+    assert get_reply_stats(quiet) == (0, None)
+
+
+@pytest.mark.django_db
+def test_compiled_lists_render_the_same_json_as_list_serializer(
+    api_client, staff_user, monkeypatch, settings
+):
+    category = Category.objects.create(title="Category")
+    article = Article.objects.create(heading="Article", summary="é", category=category)
+    ArticleImage.objects.create(
+        article=article, image="blog/articles/image.jpg", variants=IMAGE_VARIANTS
+    )
+    # Saving an image resets its variants until they are rendered.
+    ArticleImage.objects.filter(article=article).update(variants=IMAGE_VARIANTS)
+    Article.objects.create(heading="Uncategorized")
+    other = User.objects.create_user(email="user@scribbly.com", username="other")
+    root = Comment.objects.create(
+        article=article, author=staff_user.author, description="Root"
+    )
+    for author in [staff_user.author, other.author]:
+        Comment.objects.create(
+            article=article,
+            author=author,
+            parent=root,
+            reply_to=other.author,
+            description="Reply",
+        )
+    comments_kwargs = {"article_pk": article.pk}
+    urls = [
+        reverse("article-list"),
+        reverse("article-list") + "?expand=category",
+        reverse("article-comments-list", kwargs=comments_kwargs),
+        reverse("article-comments-list", kwargs=comments_kwargs) + "?expand=reply_to",
+        reverse("article-comments-replies", kwargs={**comments_kwargs, "pk": root.pk}),
+        reverse("article-comments-thread", kwargs=comments_kwargs),
+    ]
+
+    def render_all():
+        contents = []
+        for url in urls:
+            cache.clear()
+            response = api_client.get(url)
+            assert response.status_code == 200
+            contents.append(response.content)
+        return contents
+
+    for time_zone in ["UTC", "Asia/Tehran"]:
+        settings.TIME_ZONE = time_zone
+        compiled = render_all()
+        with monkeypatch.context() as patch:
+            patch.setattr(
+                CompiledListSerializer,
+                "to_representation",
+                serializers.ListSerializer.to_representation,
+            )
+            assert render_all() == compiled
+
+    assert b"+03:30" in compiled[0]
+    assert b"/blog/authors/" in compiled[4]
+    assert b"image-320w.webp" in compiled[0]
+
+
+@pytest.mark.django_db
+def test_counter_repairs_invalidate_cached_responses(
+    api_client, django_capture_on_commit_callbacks
+):
+    category = Category.objects.create(title="Category")
+    article = Article.objects.create(heading="Article", category=category)
+    CategoryCounter.objects.update(articles_count=7, subtree_articles_count=7)
+    Article.objects.update(likes_count=5)
+
+    hierarchy_url = reverse("category-hierarchical")
+    category_url = reverse("category-detail", args=[category.pk])
+    article_url = reverse("article-detail", args=[article.pk])
+    cache.clear()
+    assert api_client.get(hierarchy_url).data[0]["articles_count"] == 7
+    assert api_client.get(category_url).data["articles_count"] == 7
+    assert api_client.get(article_url).data["counts"]["likes"] == 5
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert reconcile_category_counters() == 1
+        assert repair_article_counters() == 1
+
+    assert api_client.get(hierarchy_url).data[0]["articles_count"] == 1
+    assert api_client.get(category_url).data["articles_count"] == 1
+    assert api_client.get(article_url).data["counts"]["likes"] == 0
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("depth", [1, 2, 4])
+def test_benchmark_categories_respect_the_depth(depth):
+    call_command(
+        "generate_benchmark_data",
+        users=2,
+        categories=30,
+        articles=2,
+        rooms=1,
+        category_depth=depth,
+        seed=1,
+        stdout=StringIO(),
+    )
+
+    paths = Category.objects.values_list("path", flat=True)
+    assert len(paths) == 30
+    assert max(len(path_to_ids(path)) for path in paths) <= depth
+
+
+@pytest.mark.django_db
+def test_avatars_are_served_once_their_variants_exist(
+    api_client, staff_user, django_capture_on_commit_callbacks
+):
+    article = Article.objects.create(heading="Article")
+    Comment.objects.create(article=article, author=staff_user.author)
+    me_url = reverse("author-me")
+    comments_url = reverse("article-comments-list", kwargs={"article_pk": article.pk})
+
+    with django_capture_on_commit_callbacks():
+        response = api_client.patch(
+            me_url, {"avatar": get_upload()}, format="multipart"
+        )
+    assert response.status_code == 200
+    assert response.data["avatar"] is None
+    assert api_client.get(me_url).data["avatar"] is None
+    assert api_client.get(comments_url).data["results"][0]["author"]["avatar"] is None
+
+    with django_capture_on_commit_callbacks(execute=True):
+        generate_image_variants.delay(
+            "blog.Author", staff_user.author.pk, "avatar", "avatar_variants"
+        )
+
+    assert api_client.get(me_url).data["avatar"].endswith(".png")
+    (comment,) = api_client.get(comments_url).data["results"]
+    assert comment["author"]["avatar"].endswith(".png")
@@ -0,0 +1,98 @@
+"""
+    Loads the replies below a set of top-level comments and assembles them into threads.
+"""
+from django.db import connection
+
+from .models import Comment
+
+RECURSIVE_CTE_VENDORS = {"postgresql", "sqlite"}
+
+
+def get_reply_ids(root_ids, max_depth, max_size):
+    """
+    Returns the ids of the replies below the given comments, at most `max_depth` levels
+    deep. Shallower replies are kept first when there are more than `max_size`, so every
+    returned reply has its parent in the thread.
+    """
+    if not root_ids or max_depth < 1 or max_size < 1:
+        return []
+    if connection.vendor in RECURSIVE_CTE_VENDORS:
+        return get_reply_ids_with_cte(root_ids, max_depth, max_size)
+    return get_reply_ids_by_level(root_ids, max_depth, max_size)
+
+
+def get_reply_ids_with_cte(root_ids, max_depth, max_size):
+    with connection.cursor() as cursor:
+        cursor.execute(*get_reply_ids_query(root_ids, max_depth, max_size))
+        return [row[0] for row in cursor.fetchall()]
+
+
+def get_reply_ids_query(root_ids, max_depth, max_size):
+    """
+    Returns the recursive query of get_reply_ids_with_cte and its params. The recursion
+    stops once `max_size` replies are found instead of walking the whole thread.
+    """
+    quote = connection.ops.quote_name
+    table = quote(Comment._meta.db_table)
+    parent = quote(Comment._meta.get_field("parent").column)
+    placeholders = ", ".join(["%s"] * len(root_ids))
+
+    if connection.vendor == "sqlite":
+        # SQLite takes the rows to recurse from in the order of the recursive select and
+        # stops once its limit is reached.
+        recursive_limit = "ORDER BY 2, 1 LIMIT %s"
+        thread = "thread"
+    else:
+        # PostgreSQL finds the rows of a recursive query level by level and only as many
+        # as the outer query reads.
+        recursive_limit = ""
+        thread = "(SELECT id, depth FROM thread LIMIT %s) AS bounded_thread"
+
+    sql = f"""
+        WITH RECURSIVE thread (id, depth) AS (
+            SELECT id, 1 FROM {table} WHERE {parent} IN ({placeholders})
+            UNION ALL
+            SELECT reply.id, thread.depth + 1
+            FROM {table} reply INNER JOIN thread ON reply.{parent} = thread.id
+            WHERE thread.depth < %s
+            {recursive_limit}
+        )
+        SELECT id FROM {thread} ORDER BY depth, id
+    """
+    return (sql, [*root_ids, max_depth, max_size])
+
+
+def get_reply_ids_by_level(root_ids, max_depth, max_size):
+    reply_ids = []
+    level = list(root_ids)
+
+    for _ in range(max_depth):
+        remaining = max_size - len(reply_ids)
+        if not level or remaining <= 0:
+            break
+        level = list(
+            Comment.objects.filter(parent_id__in=level)
+            .order_by("id")
+            .values_list("id", flat=True)[:remaining]
+        )
+        reply_ids.extend(level)
+
+    return reply_ids
+
+
+def assemble_threads(comments, items, root_ids):
+    """
+    Nests every serialized item under its parent's "replies" and returns the roots in the
+    order of `root_ids`. Items must be in the order replies are listed in.
+    """
+    root_ids_set = set(root_ids)
+    nodes = {}
+    for comment, item in zip(comments, items):
+        item["replies"] = []
+        nodes[comment.id] = item
+
+    for comment in comments:
+        if comment.id not in root_ids_set and comment.parent_id in nodes:
+            nodes[comment.parent_id]["replies"].append(nodes[comment.id])
+
+    return [nodes[pk] for pk in root_ids]
@@ -0,0 +1,64 @@
+"""
+    Ranks articles by their recent likes and comments, every interaction weighs less the older it gets.
+"""
+import heapq
+from collections import defaultdict
+from datetime import timedelta
+from operator import itemgetter
+
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import ArticleLike, Comment, TrendingArticle
+from .caching import invalidate_tags
+from .constants import CacheTags
+
+HALF_LIFE = timedelta(hours=12)
+WINDOW = timedelta(days=3)
+SIZE = 500
+WEIGHTS = [(ArticleLike, 1.0), (Comment, 2.0)]
+
+
+def decay(age):
+    return 0.5 ** (age / HALF_LIFE)
+
+
+def compute_trending_scores(now):
+    # Interactions are counted per article and hour, so the rows read here do not
+    # grow with the number of likes and comments.
+    scores = defaultdict(float)
+
+    for model, weight in WEIGHTS:
+        buckets = (
+            model.objects.filter(created_at__gte=now - WINDOW)
+            .annotate(hour=TruncHour("created_at"))
+            .order_by()
+            .values("article", "hour")
+            .annotate(count=Count("id"))
+            .values_list("article", "hour", "count")
+        )
+        for article_id, hour, count in buckets:
+            age = max(now - hour - timedelta(minutes=30), timedelta(0))
+            scores[article_id] += weight * count * decay(age)
+
+    return scores
+
+
+@transaction.atomic
+def refresh_trending_articles(size=SIZE):
+    now = timezone.now()
+    scores = compute_trending_scores(now)
+    ranked = heapq.nlargest(size, scores.items(), key=itemgetter(1))
+
+    TrendingArticle.objects.all().delete()
+    TrendingArticle.objects.bulk_create(
+        [
+            TrendingArticle(article_id=article_id, score=score, computed_at=now)
+            for article_id, score in ranked
+        ]
+    )
+    invalidate_tags(CacheTags.TRENDING_ARTICLES)
+
+    return len(ranked)
@@ -1,17 +1,49 @@
 """
     HierarchyBuilder, facilitates the construction of hierarchical tree structures from a list of items with parent-child relationships.
 """
+import re
+from collections import defaultdict
+
+from django.template.defaultfilters import slugify
 
 
 class HierarchyBuilder:
     def build(self, items, parent=None):
-        result = []
+        children_by_parent = defaultdict(list)
+        for item in items:
+            children_by_parent[item["parent"]].append(item)
 
         for item in items:
-            if item["parent"] == parent:
-                children = self.build(items, item["id"])
-                if children:
-                    item["children"] = children
-                result.append(item)
+            children = children_by_parent.get(item["id"])
+            if children:
+                item["children"] = children
+
+        return children_by_parent.get(parent, [])
+
+
+def generate_unique_slug(instance, value):
+    model = instance.__class__
+    max_length = model._meta.get_field("slug").max_length
+    base = (slugify(value) or model._meta.model_name)[: max_length - 10]
+
+    if instance.slug and re.fullmatch(rf"{re.escape(base)}(-\d+)?", instance.slug):
+        return instance.slug
+
+    taken = set(
+        model.objects.filter(slug__startswith=base)
+        .exclude(pk=instance.pk)
+        .values_list("slug", flat=True)
+    )
+
+    slug = base
+    suffix = 2
+    while slug in taken:
+        slug = f"{base}-{suffix}"
+        suffix += 1
+
+    return slug
+
 
-        return result
+def parse_query_list(request, param):
+    value = request.query_params.get(param, "")
+    return {name.strip() for name in value.split(",") if name.strip()}
@@ -1,7 +1,11 @@
+from django.db import transaction
 from django.shortcuts import get_object_or_404
-from django.db.models.aggregates import Count
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+from django.db.models.functions import Coalesce, Length
 
 from rest_framework import status
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.mixins import (
     ListModelMixin,
     RetrieveModelMixin,
@@ -9,15 +13,18 @@ from rest_framework.mixins import (
     CreateModelMixin,
 )
 from rest_framework.viewsets import GenericViewSet, ModelViewSet
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.pagination import _positive_int
 
 from .models import Author, Category, Article, ArticleImage, ArticleLike, Comment
 from .serializers import (
     AuthorSerializer,
     CategorySerializer,
     ArticleSerializer,
+    ArticleSearchSerializer,
+    ArticleLikedByMeSerializer,
     ArticleCreateUpdateSerializer,
     ArticleImageSerializer,
     ArticleLikeSerializer,
@@ -26,14 +33,54 @@ from .serializers import (
     CommentReplySerializer,
 )
 from .permissions import IsOwnerOrReadOnly, IsAdminOrReadOnly
-from .pagination import DefaultLimitOffsetPagination
-from .utils import HierarchyBuilder
+from .pagination import (
+    DefaultLimitOffsetPagination,
+    KeysetPagination,
+    OptInKeysetPagination,
+)
+from .utils import HierarchyBuilder, parse_query_list
+from .search import search_articles
+from .threads import get_reply_ids, assemble_threads
+from .constants import CacheKeys, CacheTags
+from .caching import CachedResponseMixin
+from .planning import QueryPlanMixin
+from . import likes
+from users.constants import CacheTimeouts
+
+
+class SparseFieldsetMixin(QueryPlanMixin):
+    """
+    Passes ?fields= and ?expand= to the serializer of safe requests, so the
+    queryset is only planned for the fields it renders.
+    """
+
+    fields_query_param = "fields"
+    expand_query_param = "expand"
+    full_fieldset_actions = []
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        request = context.get("request")
+
+        if (
+            request is not None
+            and request.method in SAFE_METHODS
+            and getattr(self, "action", None) not in self.full_fieldset_actions
+        ):
+            context["fields"] = parse_query_list(request, self.fields_query_param)
+            context["expand"] = parse_query_list(request, self.expand_query_param)
+
+        return context
 
 
 class AuthorViewSet(
-    ListModelMixin, RetrieveModelMixin, UpdateModelMixin, GenericViewSet
+    SparseFieldsetMixin,
+    ListModelMixin,
+    RetrieveModelMixin,
+    UpdateModelMixin,
+    GenericViewSet,
 ):
-    queryset = Author.objects.select_related("user").all()
+    queryset = Author.objects.all()
     serializer_class = AuthorSerializer
     permission_classes = [IsAuthenticated]
 
@@ -48,44 +95,192 @@ class AuthorViewSet(
             return self.partial_update(request, *args, **kwargs)
 
     def get_current_author(self):
-        return self.request.user.author
+        return get_object_or_404(self.get_queryset(), user=self.request.user)
 
 
-class CategoryViewSet(ModelViewSet):
-    queryset = (
-        Category.objects.annotate(articles_count=Count("articles"))
-        .prefetch_related("children")
-        .all()
-    )
+class CategoryViewSet(SparseFieldsetMixin, CachedResponseMixin, ModelViewSet):
+    queryset = Category.objects.all()
     serializer_class = CategorySerializer
     pagination_class = DefaultLimitOffsetPagination
     permission_classes = [IsAdminOrReadOnly]
+    cache_tags = [CacheTags.ALL_CATEGORIES]
+    full_fieldset_actions = ["hierarchical"]
 
     @action(methods=["GET"], detail=False)
     def hierarchical(self, request, *args, **kwargs):
+        hierarchical_categories = cache.get(CacheKeys.CATEGORY_HIERARCHY)
+
+        if hierarchical_categories is None:
+            hierarchical_categories = self.build_hierarchy()
+            cache.set(
+                key=CacheKeys.CATEGORY_HIERARCHY,
+                value=hierarchical_categories,
+                timeout=CacheTimeouts.HOUR,
+            )
+
+        return Response(hierarchical_categories, status=status.HTTP_200_OK)
+
+    @action(methods=["GET"], detail=False, url_path=r"by-slug/(?P<slug>[-\w]+)")
+    def by_slug(self, request, *args, **kwargs):
+        self.lookup_field = "slug"
+        return self.retrieve(request, *args, **kwargs)
+
+    @action(methods=["GET"], detail=True)
+    def descendants(self, request, *args, **kwargs):
+        category = self.get_object()
+        queryset = (
+            self.get_queryset()
+            .filter(path__startswith=category.path)
+            .exclude(pk=category.pk)
+            .order_by("path")
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(methods=["GET"], detail=True)
+    def ancestors(self, request, *args, **kwargs):
+        category = self.get_object()
+        queryset = (
+            self.get_queryset()
+            .filter(pk__in=category.ancestor_ids)
+            .order_by(Length("path"))
+        )
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    def get_required_lookups(self):
+        lookups = super().get_required_lookups()
+        if self.action in ["descendants", "ancestors"]:
+            lookups.append("path")
+        return lookups
+
+    def build_hierarchy(self):
         queryset = self.filter_queryset(self.get_queryset())
         serializer = self.get_serializer(queryset, many=True)
         builder = HierarchyBuilder()
-        hierarchical_categories = builder.build(serializer.data)
-        return Response(hierarchical_categories, status=status.HTTP_200_OK)
+        return builder.build([dict(item) for item in serializer.data])
 
 
-class ArticleViewSet(ModelViewSet):
-    queryset = (
-        Article.objects.select_related("category").prefetch_related("images").all()
-    )
+class ArticleViewSet(SparseFieldsetMixin, CachedResponseMixin, ModelViewSet):
+    queryset = Article.objects.defer("search_vector")
     serializer_class = ArticleSerializer
-    pagination_class = DefaultLimitOffsetPagination
+    pagination_class = OptInKeysetPagination
     permission_classes = [IsAdminOrReadOnly]
+    liked_by_me_max_ids = 100
+    prefetch_querysets = {
+        "images": ArticleImage.objects.filter(variants__isnull=False),
+    }
 
     def get_queryset(self):
-        return (
-            super()
-            .get_queryset()
-            .annotate(comments_count=Count("comments", distinct=True))
-            .annotate(likes_count=Count("likes", distinct=True))
+        queryset = super().get_queryset()
+
+        category_tree = self.request.query_params.get("category_tree")
+        if category_tree is not None:
+            queryset = self.filter_category_tree(queryset, category_tree)
+
+        if (
+            self.request.user.is_authenticated
+            and "liked_by_me" in self.get_rendered_fields()
+        ):
+            queryset = self.annotate_liked_by_me(queryset)
+
+        return queryset
+
+    def annotate_liked_by_me(self, queryset):
+        return queryset.annotate(
+            liked_by_me=Exists(
+                ArticleLike.objects.filter(
+                    article=OuterRef("pk"), author__user=self.request.user
+                )
+            )
         )
 
+    @action(methods=["GET"], detail=False, url_path=r"by-slug/(?P<slug>[-\w]+)")
+    def by_slug(self, request, *args, **kwargs):
+        self.lookup_field = "slug"
+        return self.retrieve(request, *args, **kwargs)
+
+    @action(
+        methods=["GET"],
+        detail=False,
+        serializer_class=ArticleSearchSerializer,
+        pagination_class=DefaultLimitOffsetPagination,
+    )
+    def search(self, request, *args, **kwargs):
+        text = request.query_params.get("q", "").strip()
+        if not text:
+            raise ValidationError({"q": "This query parameter is required."})
+
+        queryset = search_articles(self.filter_queryset(self.get_queryset()), text)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        methods=["GET"],
+        detail=False,
+        pagination_class=DefaultLimitOffsetPagination,
+    )
+    def trending(self, request, *args, **kwargs):
+        return self.cached_response(self.list_trending, request, *args, **kwargs)
+
+    def list_trending(self, request, *args, **kwargs):
+        queryset = (
+            self.filter_queryset(self.get_queryset())
+            .filter(trending__isnull=False)
+            .order_by("-trending__score", "id")
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="liked-by-me",
+        serializer_class=ArticleLikedByMeSerializer,
+        permission_classes=[IsAuthenticated],
+        pagination_class=None,
+    )
+    def liked_by_me(self, request, *args, **kwargs):
+        ids = parse_query_list(request, "ids")
+        if not ids or not all(pk.isdigit() for pk in ids):
+            raise ValidationError({"ids": "A list of integers is required."})
+        if len(ids) > self.liked_by_me_max_ids:
+            raise ValidationError(
+                {"ids": f"At most {self.liked_by_me_max_ids} ids are allowed."}
+            )
+
+        queryset = Article.objects.filter(pk__in=ids).order_by("id")
+        if likes.is_enabled():
+            # Buffered likes are answered from Redis, the database lags behind them.
+            article_ids = list(queryset.values_list("id", flat=True))
+            liked = likes.has_liked(article_ids, request.user.author.id)
+            data = [{"id": pk, "liked_by_me": liked[pk]} for pk in article_ids]
+        else:
+            data = self.annotate_liked_by_me(queryset).values("id", "liked_by_me")
+        serializer = self.get_serializer(data, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    def filter_category_tree(self, queryset, category_id):
+        if not category_id.isdigit():
+            raise ValidationError({"category_tree": "A valid integer is required."})
+
+        category_path = Category.objects.filter(pk=category_id).values("path")
+        return queryset.filter(category__path__startswith=category_path)
+
+    def get_cache_tags(self):
+        if self.action == "retrieve":
+            return [CacheTags.article(self.kwargs["pk"]), CacheTags.ALL_CATEGORIES]
+        if self.action == "trending":
+            return [
+                CacheTags.TRENDING_ARTICLES,
+                CacheTags.ALL_ARTICLES,
+                CacheTags.ALL_CATEGORIES,
+            ]
+        return [CacheTags.ALL_ARTICLES, CacheTags.ALL_CATEGORIES]
+
     def get_serializer_class(self):
         if self.action == "comments":
             self.serializer_class = CommentSerializer
@@ -94,14 +289,20 @@ class ArticleViewSet(ModelViewSet):
         return super().get_serializer_class()
 
 
-class ArticleImageViewSet(ModelViewSet):
+class ArticleImageViewSet(QueryPlanMixin, ModelViewSet):
     queryset = ArticleImage.objects.all()
     serializer_class = ArticleImageSerializer
     pagination_class = DefaultLimitOffsetPagination
     permission_classes = [IsAdminOrReadOnly]
 
     def get_queryset(self):
-        return super().get_queryset().filter(article_id=self.kwargs["article_pk"])
+        queryset = super().get_queryset().filter(article_id=self.kwargs["article_pk"])
+
+        # Images are only served once their variants have been rendered.
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(variants__isnull=False)
+
+        return queryset
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -109,11 +310,13 @@ class ArticleImageViewSet(ModelViewSet):
         return context
 
 
-class ArticleLikeViewSet(ListModelMixin, CreateModelMixin, GenericViewSet):
-    queryset = ArticleLike.objects.select_related("author").all()
+class ArticleLikeViewSet(
+    QueryPlanMixin, ListModelMixin, CreateModelMixin, GenericViewSet
+):
+    queryset = ArticleLike.objects.all()
     serializer_class = ArticleLikeSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = DefaultLimitOffsetPagination
+    pagination_class = OptInKeysetPagination
 
     def get_queryset(self):
         return super().get_queryset().filter(article_id=self.kwargs["article_pk"])
@@ -123,8 +326,31 @@ class ArticleLikeViewSet(ListModelMixin, CreateModelMixin, GenericViewSet):
         context["article_id"] = self.kwargs["article_pk"]
         return context
 
+    def create(self, request, *args, **kwargs):
+        if not likes.is_enabled():
+            return super().create(request, *args, **kwargs)
+
+        author_id = request.user.author.id
+        liked = likes.like(self.get_article_id(), author_id)
+        if liked is None:
+            raise NotFound()
+        if not liked:
+            raise ValidationError({"author": "You have already liked this article."})
+
+        return Response({"author": author_id}, status=status.HTTP_202_ACCEPTED)
+
+    @transaction.atomic
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+
+    @transaction.atomic
     @action(methods=["DELETE"], detail=False)
     def dislike(self, request, *args, **kwargs):
+        if likes.is_enabled():
+            if not likes.unlike(self.get_article_id(), request.user.author.id):
+                raise NotFound()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
         get_object_or_404(
             ArticleLike,
             article_id=self.kwargs.get("article_pk"),
@@ -132,26 +358,61 @@ class ArticleLikeViewSet(ListModelMixin, CreateModelMixin, GenericViewSet):
         ).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def get_article_id(self):
+        try:
+            return int(self.kwargs["article_pk"])
+        except ValueError:
+            raise NotFound()
 
-class CommentViewSet(ModelViewSet):
-    queryset = (
-        Comment.objects.select_related("author__user")
-        .select_related("reply_to__user")
-        .annotate(replies_count=Count("replies"))
-    )
+
+class CommentViewSet(SparseFieldsetMixin, CachedResponseMixin, ModelViewSet):
+    queryset = Comment.objects.all()
     serializer_class = CommentSerializer
-    pagination_class = DefaultLimitOffsetPagination
+    pagination_class = OptInKeysetPagination
     permission_classes = [IsAuthenticated, IsOwnerOrReadOnly]
+    thread_default_depth = 3
+    thread_max_depth = 10
+    thread_max_replies = 500
+
+    @property
+    def cursor_ordering(self):
+        if self.action == "replies":
+            return ("created_at", "id")
+        if self.action in ["list", "thread"]:
+            return ("-last_activity_at", "-id")
+        return KeysetPagination.ordering
 
     def get_queryset(self):
         queryset = super().get_queryset()
 
-        if self.action == "retrieve":
+        if self.action in ["retrieve", "thread"]:
             return queryset.filter(article_id=self.kwargs["article_pk"])
         if self.action == "replies":
-            return queryset.filter(parent=self.kwargs["pk"]).order_by("created_at")
+            return queryset.filter(
+                article_id=self.kwargs["article_pk"], parent=self.kwargs["pk"]
+            ).order_by("created_at")
+
+        return self.annotate_last_activity(
+            queryset.filter(article_id=self.kwargs["article_pk"], parent=None)
+        )
 
-        return queryset.filter(article_id=self.kwargs["article_pk"], parent=None)
+    def annotate_last_activity(self, queryset):
+        # Matches the expression of the comment activity index.
+        return queryset.annotate(
+            last_activity_at=Coalesce("last_reply_at", "created_at")
+        )
+
+    def get_required_lookups(self):
+        lookups = super().get_required_lookups()
+        if self.action == "thread":
+            lookups.append("parent")
+        return lookups
+
+    def get_cache_tags(self):
+        return [
+            CacheTags.article_comments(self.kwargs["article_pk"]),
+            CacheTags.ALL_AUTHORS,
+        ]
 
     def get_serializer_class(self):
         if self.action == "replies":
@@ -170,8 +431,47 @@ class CommentViewSet(ModelViewSet):
 
         return context
 
+    @transaction.atomic
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+
     @action(methods=["GET", "POST"], detail=True)
     def replies(self, request, *args, **kwargs):
         if request.method == "POST":
             return self.create(request, *args, **kwargs)
         return self.list(request, *args, **kwargs)
+
+    @action(methods=["GET"], detail=False)
+    def thread(self, request, *args, **kwargs):
+        return self.cached_response(self.list_thread, request, *args, **kwargs)
+
+    def list_thread(self, request, *args, **kwargs):
+        queryset = self.get_queryset()
+        roots = self.paginate_queryset(
+            self.annotate_last_activity(queryset.filter(parent=None))
+        )
+        root_ids = [comment.id for comment in roots]
+
+        reply_ids = get_reply_ids(
+            root_ids, self.get_thread_depth(request), self.thread_max_replies
+        )
+        replies = list(queryset.filter(pk__in=reply_ids).order_by("created_at", "id"))
+
+        comments = roots + replies
+        serializer = self.get_serializer(comments, many=True)
+        threads = assemble_threads(comments, serializer.data, root_ids)
+        return self.get_paginated_response(threads)
+
+    def get_thread_depth(self, request):
+        try:
+            return _positive_int(
+                request.query_params["depth"],
+                strict=True,
+                cutoff=self.thread_max_depth,
+            )
+        except (KeyError, ValueError):
+            return self.thread_default_depth
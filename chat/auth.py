@@ -1,7 +1,9 @@
 from django.contrib.auth.models import AnonymousUser
-from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
 from channels.db import database_sync_to_async
 
+from users.authentication import CachedTokenAuthentication
+
 
 @database_sync_to_async
 def get_user(scope):
@@ -10,9 +12,11 @@ def get_user(scope):
         try:
             (header_type, key) = headers[b"authorization"].decode().split()
             if header_type == "Token":
-                token = Token.objects.get(key=key)
-                return token.user
-        except:
+                (user, token) = CachedTokenAuthentication().authenticate_credentials(
+                    key
+                )
+                return user
+        except (ValueError, AuthenticationFailed):
             return AnonymousUser()
 
     return AnonymousUser()
@@ -50,7 +50,7 @@ class ChatConsumer(WebsocketConsumer):
             "message": Messages.CONNECTION_SUCCESS_MESSAGE,
             "contact": {
                 "username": self.contact.username,
-                "avatar": self.get_avatar_url(self.contact.author.avatar),
+                "avatar": self.get_avatar_url(self.contact.author),
             },
             "history": [
                 {
@@ -152,5 +152,8 @@ class ChatConsumer(WebsocketConsumer):
     def get_contact(self, pk):
         return User.objects.select_related("author").get(pk=pk)
 
-    def get_avatar_url(self, avatar):
-        return f"{settings.BASE_BACKEND_URL}{avatar.url}" if avatar else None
+    def get_avatar_url(self, author):
+        # Avatars are only served once their variants have been rendered.
+        if not author.avatar or author.avatar_variants is None:
+            return None
+        return f"{settings.BASE_BACKEND_URL}{author.avatar.url}"
@@ -0,0 +1,25 @@
+# Generated by Django 4.1.2 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0008_add_field_seen_to_message"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["sender", "recipient", "created_at"],
+                name="chat_messag_sender__458021_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="room",
+            index=models.Index(
+                fields=["user", "contact"], name="chat_room_user_id_80459a_idx"
+            ),
+        ),
+    ]
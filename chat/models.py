@@ -9,6 +9,11 @@ class Room(models.Model):
     contact = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "contact"]),
+        ]
+
 
 class Message(models.Model):
     content = models.TextField()
@@ -20,3 +25,8 @@ class Message(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     seen = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["sender", "recipient", "created_at"]),
+        ]
@@ -1,3 +1,108 @@
-from django.test import TestCase
+import pytest
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from chat.auth import TokenAuthMiddleware
+from chat.consumers import ChatConsumer
+from chat.models import Message, Room
+from chat.routing import websocket_urlpatterns
+from users.models import AuthToken, User
+
+SIZES = [1, 10, 50]
+
+application = TokenAuthMiddleware(URLRouter(websocket_urlpatterns))
+
+
+def seed_chat(size):
+    user = User.objects.create_user(email="user@scribbly.com", is_active=True)
+    contact = User.objects.create_user(email="contact@scribbly.com")
+    Room.objects.create(user=user, contact=contact)
+    Room.objects.create(user=contact, contact=user)
+    messages = Message.objects.bulk_create(
+        [
+            Message(content=f"Message {index}", sender=sender, recipient=recipient)
+            for index in range(size)
+            for (sender, recipient) in [(user, contact), (contact, user)]
+        ]
+    )
+    return (user, contact, messages)
+
+
+def get_communicator(token, contact):
+    return WebsocketCommunicator(
+        application,
+        f"/ws/socket-server/{contact.pk}/",
+        headers=[(b"authorization", f"Token {token.key}".encode())],
+    )
+
+
+async def connect(communicator):
+    (connected, _) = await communicator.connect()
+    detail = await communicator.receive_json_from()
+    return (connected, detail)
+
+
+async def get_history(communicator):
+    (connected, detail) = await connect(communicator)
+    await communicator.disconnect()
+    return (connected, detail)
+
+
+async def chat(communicator, content, seen_messages):
+    await connect(communicator)
+    await communicator.send_json_to(
+        {"content": content, "seen_messages": seen_messages}
+    )
+    events = [await communicator.receive_json_from() for _ in range(2)]
+    await communicator.disconnect()
+    return events
+
+
+# The consumer closes the connection of the test transaction between events.
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize("size", SIZES)
+def test_connect_query_budget_does_not_grow_with_rows(size):
+    (user, contact, messages) = seed_chat(size)
+    token = AuthToken.objects.create(user=user)
+
+    with CaptureQueriesContext(connection) as context:
+        (connected, detail) = async_to_sync(get_history)(
+            get_communicator(token, contact)
+        )
+
+    assert connected
+    assert len(detail["history"]) == len(messages)
+    assert len(context) == 5
+
+    # A warm token is authenticated without a query.
+    with CaptureQueriesContext(connection) as context:
+        async_to_sync(get_history)(get_communicator(token, contact))
+    assert len(context) == 4
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize("size", SIZES)
+def test_receive_query_budget_does_not_grow_with_rows(size):
+    (user, contact, messages) = seed_chat(size)
+    communicator = get_communicator(AuthToken.objects.create(user=user), contact)
+    seen_messages = [message.pk for message in messages]
+
+    with CaptureQueriesContext(connection) as context:
+        events = async_to_sync(chat)(communicator, "Hello", seen_messages)
+
+    assert [event["type"] for event in events] == ["chat", "seen"]
+    # Connecting takes 5 queries, storing the message and marking messages seen 2.
+    assert len(context) == 7
+
+
+def test_history_queries_use_indexes(assert_uses_indexes, benchmark_data):
+    room = Room.objects.first()
+    consumer = ChatConsumer()
+    consumer.user_room = room
+
+    assert_uses_indexes(Room.objects.filter(user=room.user, contact=room.contact))
+    assert_uses_indexes(consumer.get_history(room.user, room.contact))
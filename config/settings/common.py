@@ -2,7 +2,9 @@ import os
 import dj_database_url
 
 from pathlib import Path
+from datetime import timedelta
 from dotenv import load_dotenv
+from celery.schedules import crontab
 
 from config.email import *
 from config.auth.google import *
@@ -23,6 +25,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "rest_framework",
+    # Only kept for users migration 0012, which copies its tokens to AuthToken.
     "rest_framework.authtoken",
     "corsheaders",
     "django_filters",
@@ -104,13 +107,21 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 REST_FRAMEWORK = {
     "COERCE_DECIMAL_TO_STRING": False,
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework.authentication.TokenAuthentication",
+        "users.authentication.CachedTokenAuthentication",
     ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 
+# Tokens expire once unused for this long, every use renews them.
+AUTH_TOKEN_LIFETIME = timedelta(days=30)
+# Renewals are written to the database at most this often per token.
+AUTH_TOKEN_RENEW_INTERVAL = timedelta(hours=1)
+
 REDIS_URL = os.environ.get("REDIS_URL")
 
+# Likes and unlikes are written to Redis first and flushed to the database in batches.
+BLOG_BUFFERED_LIKES = os.environ.get("BLOG_BUFFERED_LIKES") == "True"
+
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
@@ -149,3 +160,22 @@ CHANNEL_LAYERS = {
 #     },
 # }
 CELERY_BROKER_URL = os.environ.get("BROKER_URL")
+
+CELERY_BEAT_SCHEDULE = {
+    "repair_article_counters": {
+        "task": "blog.tasks.repair_article_counters",
+        "schedule": crontab(minute=0, hour="*/6"),
+    },
+    "refresh_trending_articles": {
+        "task": "blog.tasks.refresh_trending_articles",
+        "schedule": crontab(minute="*/10"),
+    },
+    "flush_buffered_likes": {
+        "task": "blog.tasks.flush_buffered_likes",
+        "schedule": 5.0,
+    },
+    "purge_expired_tokens": {
+        "task": "users.tasks.purge_expired_tokens",
+        "schedule": crontab(minute=30),
+    },
+}
@@ -0,0 +1,113 @@
+import json
+from io import StringIO
+
+import pytest
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from users.authentication import local_cache
+from users.email import reused_connection
+from users.models import User
+
+
+@pytest.fixture(autouse=True)
+def test_settings(settings, tmp_path):
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    settings.BLOG_BUFFERED_LIKES = False
+    settings.MEDIA_ROOT = tmp_path
+    settings.EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+    settings.DEBUG_TOOLBAR_CONFIG = {"SHOW_TOOLBAR_CALLBACK": lambda request: False}
+    cache.clear()
+    local_cache.clear()
+    reused_connection.close()
+
+
+@pytest.fixture
+def staff_user(db):
+    return User.objects.create_superuser(email="staff@scribbly.com", password="pass")
+
+
+@pytest.fixture
+def api_client(staff_user):
+    client = APIClient()
+    client.force_authenticate(staff_user)
+    return client
+
+
+@pytest.fixture
+def assert_query_budget(api_client):
+    """
+    Requests a url and asserts it ran exactly `budget` queries. The cache is cleared
+    first, so cached responses are measured as they are built.
+    """
+
+    def assert_budget(url, budget):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.get(url)
+
+        assert response.status_code == 200, response.content
+        queries = "\n".join(query["sql"] for query in context.captured_queries)
+        assert (
+            len(context) == budget
+        ), f"{url} ran {len(context)} queries, its budget is {budget}:\n{queries}"
+        return response
+
+    return assert_budget
+
+
+@pytest.fixture
+def benchmark_data(db):
+    call_command(
+        "generate_benchmark_data",
+        users=50,
+        categories=10,
+        articles=50,
+        rooms=20,
+        seed=1,
+        stdout=StringIO(),
+    )
+
+
+def get_plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from get_plan_nodes(child)
+
+
+@pytest.fixture
+def assert_uses_indexes(db):
+    """
+    Asserts that no table is scanned sequentially to run a queryset. Sequential scans
+    are disabled while planning, so one only shows up when no index serves the query.
+    With `index_condition`, one of the index scans must also be bounded by that text.
+    """
+    if connection.vendor != "postgresql":
+        pytest.skip("Query plans are only checked on PostgreSQL.")
+
+    def assert_indexes(queryset, index_condition=None):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        (explained,) = json.loads(queryset.explain(format="json"))
+        nodes = list(get_plan_nodes(explained["Plan"]))
+        scanned = [
+            node["Relation Name"] for node in nodes if node["Node Type"] == "Seq Scan"
+        ]
+        assert not scanned, f"Sequential scan of {scanned}:\n{queryset.query}"
+
+        if index_condition is not None:
+            conditions = [node["Index Cond"] for node in nodes if "Index Cond" in node]
+            assert any(
+                index_condition in condition for condition in conditions
+            ), f"No index condition on {index_condition}:\n{conditions}"
+
+    return assert_indexes
@@ -1,3 +1,5 @@
 from django.contrib import admin
+from rest_framework.authtoken.models import TokenProxy
 
-# Register your models here.
+# Its tokens no longer authenticate anyone, see AuthToken.
+admin.site.unregister(TokenProxy)
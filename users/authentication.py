@@ -0,0 +1,163 @@
+"""
+    Token authentication that answers warm tokens without a database query. The user a token
+    belongs to and the token's expiry are cached in a small per-process LRU, in front of the shared cache. Deleting
+    a token or saving its user drops both entries once the transaction commits. The LRU of
+    other processes keeps serving a dropped token for at most LOCAL_TIMEOUT seconds.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from .constants import CacheTimeouts
+from .models import AuthToken
+
+User = get_user_model()
+
+CACHE_TIMEOUT = CacheTimeouts.HOUR
+LOCAL_SIZE = 1024
+LOCAL_TIMEOUT = 10
+
+
+class LocalCache:
+    """A thread-safe LRU whose entries also expire after `timeout` seconds."""
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            (value, expires_at) = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_cache = LocalCache(LOCAL_SIZE, LOCAL_TIMEOUT)
+
+
+def get_token_cache_key(key):
+    # Tokens are credentials, the cache only ever sees their digest.
+    return f"users:token:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def get_snapshot(user):
+    # The password hash stays out of the caches, code checking it loads the user.
+    return {
+        field.attname: getattr(user, field.attname)
+        for field in User._meta.concrete_fields
+        if field.attname != "password"
+    }
+
+
+def from_snapshot(snapshot):
+    return User.from_db(DEFAULT_DB_ALIAS, list(snapshot), list(snapshot.values()))
+
+
+def get_token_entry(key):
+    """
+    Returns the snapshot of the user of a token with the token's expiry, or None if no
+    token has the key.
+    """
+    cache_key = get_token_cache_key(key)
+
+    entry = local_cache.get(cache_key)
+    if entry is None:
+        entry = cache.get(cache_key)
+        if entry is None:
+            try:
+                token = AuthToken.objects.select_related("user").get(key=key)
+            except AuthToken.DoesNotExist:
+                return None
+            entry = {
+                "user": get_snapshot(token.user),
+                "last_used": token.last_used,
+                "expires_at": token.expires_at,
+            }
+            cache.set(cache_key, entry, timeout=CACHE_TIMEOUT)
+        local_cache.set(cache_key, entry)
+
+    return entry
+
+
+def renew_token(key, entry, now):
+    """Pushes the expiry of a token back, unless another request has just done so."""
+    expires_at = now + settings.AUTH_TOKEN_LIFETIME
+    renewed = AuthToken.objects.filter(
+        key=key, last_used__lt=now - settings.AUTH_TOKEN_RENEW_INTERVAL
+    ).update(last_used=now, expires_at=expires_at)
+
+    if renewed:
+        entry = {**entry, "last_used": now, "expires_at": expires_at}
+        cache_key = get_token_cache_key(key)
+        cache.set(cache_key, entry, timeout=CACHE_TIMEOUT)
+        local_cache.set(cache_key, entry)
+    else:
+        # Renewed by another process or deleted meanwhile, the next request reloads it.
+        invalidate_token(key)
+
+
+def invalidate_token(key):
+    cache_key = get_token_cache_key(key)
+    local_cache.delete(cache_key)
+    cache.delete(cache_key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        entry = get_token_entry(key)
+        if entry is None:
+            raise exceptions.AuthenticationFailed("Invalid token.")
+
+        now = timezone.now()
+        if entry["expires_at"] <= now:
+            raise exceptions.AuthenticationFailed("Token has expired.")
+
+        user = from_snapshot(entry["user"])
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed("User inactive or deleted.")
+
+        if now - entry["last_used"] >= settings.AUTH_TOKEN_RENEW_INTERVAL:
+            renew_token(key, entry, now)
+
+        token = AuthToken.from_db(
+            DEFAULT_DB_ALIAS,
+            ["key", "user_id", "last_used", "expires_at"],
+            [key, user.pk, entry["last_used"], entry["expires_at"]],
+        )
+        token.user = user
+        return (user, token)
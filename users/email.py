@@ -1,11 +1,27 @@
+"""
+    Transactional emails. Views only describe a message, a Celery worker renders and sends
+    it over a connection to the mail server that it keeps open between tasks.
+"""
+import threading
+import time
+from smtplib import SMTPException
+
 from django.conf import settings
+from django.core import mail
 from django.utils.html import urlencode
+from django.contrib.auth import get_user_model
 from django.contrib.auth.tokens import default_token_generator
+from django.contrib.sites.shortcuts import get_current_site
 
 from templated_mail.mail import BaseEmailMessage
 
 from .utils import encode_uid
 
+User = get_user_model()
+
+# Mail servers drop idle connections, one unused for longer is reopened before sending.
+IDLE_TIMEOUT = 30
+
 
 class PasswordResetEmail(BaseEmailMessage):
     template_name = "reset_password.html"
@@ -13,7 +29,7 @@ class PasswordResetEmail(BaseEmailMessage):
     def get_context_data(self):
         context = super().get_context_data()
 
-        user = context.get("user")
+        user = context.get("user") or User.objects.get(pk=context["user_id"])
         uid = encode_uid(user.pk)
         token = default_token_generator.make_token(user)
         url = (
@@ -43,3 +59,93 @@ class ActivationEmail(BaseEmailMessage):
         context["code"] = code
 
         return context
+
+
+EMAILS = {
+    "reset_password": PasswordResetEmail,
+    "activation": ActivationEmail,
+}
+
+
+class EmailSendError(Exception):
+    def __init__(self, remaining):
+        super().__init__(f"{len(remaining)} emails were not sent.")
+        self.remaining = remaining
+
+
+class ReusedConnection:
+    """A connection to the email backend that stays open until it has been idle too long."""
+
+    def __init__(self, idle_timeout):
+        self.idle_timeout = idle_timeout
+        self.connection = None
+        self.last_used = 0.0
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            if time.monotonic() - self.last_used > self.idle_timeout:
+                self._close()
+            if self.connection is None:
+                connection = mail.get_connection()
+                # Only a connection that opened is kept, a failed one is retried.
+                connection.open()
+                self.connection = connection
+            self.last_used = time.monotonic()
+            return self.connection
+
+    def close(self):
+        with self.lock:
+            self._close()
+
+    def _close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except (SMTPException, OSError):
+                pass
+        self.connection = None
+
+
+reused_connection = ReusedConnection(IDLE_TIMEOUT)
+
+
+def get_message(request, name, to, **context):
+    """
+    Describes an email for send_emails. The site is taken from the request here, as the
+    worker that renders the email has no request.
+    """
+    site = get_current_site(request)
+    context.update(
+        domain=getattr(settings, "DOMAIN", "") or site.domain,
+        protocol="https" if request.is_secure() else "http",
+        site_name=getattr(settings, "SITE_NAME", "") or site.name,
+    )
+    return {"name": name, "to": to, "context": context}
+
+
+def send_emails(messages):
+    """
+    Renders and sends messages one after another over the reused connection, and returns
+    how many were sent. If the connection cannot be opened or sending fails, raises
+    EmailSendError with the messages that were not sent. Messages whose user has been deleted are skipped.
+    """
+    try:
+        connection = reused_connection.get()
+    except (SMTPException, OSError) as error:
+        raise EmailSendError(messages) from error
+
+    sent = 0
+    for index, message in enumerate(messages):
+        try:
+            email = EMAILS[message["name"]](
+                context=message["context"], connection=connection
+            )
+            email.send(to=message["to"])
+        except User.DoesNotExist:
+            continue
+        except (SMTPException, OSError) as error:
+            reused_connection.close()
+            raise EmailSendError(messages[index:]) from error
+        sent += 1
+    return sent
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.2 on 2026-10-18 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("users", "0009_alter_user_username_set_default_generate_random"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                fields=["date_joined", "id"], name="users_user_date_jo_5aa9d9_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.1.2 on 2026-10-18 18:46
+
+from itertools import islice
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+
+
+def copy_tokens(apps, schema_editor):
+    Token = apps.get_model("authtoken", "Token")
+    AuthToken = apps.get_model("users", "AuthToken")
+    # Keeps the creation time of the copied tokens, the historical model is ours alone.
+    AuthToken._meta.get_field("created").auto_now_add = False
+
+    # Existing tokens get a full lifetime, so nobody is logged out by the upgrade.
+    now = timezone.now()
+    expires_at = now + settings.AUTH_TOKEN_LIFETIME
+    tokens = Token.objects.order_by("created").iterator(chunk_size=BATCH_SIZE)
+    while True:
+        batch = [
+            AuthToken(
+                key=token.key,
+                user_id=token.user_id,
+                created=token.created,
+                last_used=now,
+                expires_at=expires_at,
+            )
+            for token in islice(tokens, BATCH_SIZE)
+        ]
+        if not batch:
+            return
+        AuthToken.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("authtoken", "0003_tokenproxy"),
+        ("users", "0011_create_authtoken"),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_tokens, migrations.RunPython.noop),
+    ]
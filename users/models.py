@@ -1,4 +1,9 @@
+import binascii
+import os
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import PermissionsMixin
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.base_user import AbstractBaseUser, BaseUserManager
@@ -44,6 +49,69 @@ class User(AbstractBaseUser, PermissionsMixin):
     date_joined = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["date_joined", "id"]),
+        ]
+
     EMAIL_FIELD = "email"
     USERNAME_FIELD = "username"
     REQUIRED_FIELDS = ["email"]
+
+
+class AuthTokenManager(models.Manager):
+    def issue(self, user):
+        """Returns the live token of a user, replacing an expired one."""
+        (token, created) = self.get_or_create(user=user)
+        if not created and token.is_expired():
+            token.delete()
+            token = self.create(user=user)
+        return token
+
+    def purge_expired(self, batch_size=1000):
+        """
+        Deletes expired tokens a batch at a time, so no transaction locks many rows for
+        long. Returns how many were deleted.
+        """
+        purged = 0
+        while True:
+            keys = list(
+                self.filter(expires_at__lte=timezone.now()).values_list(
+                    "key", flat=True
+                )[:batch_size]
+            )
+            if not keys:
+                return purged
+            (deleted, _) = self.filter(key__in=keys).delete()
+            purged += deleted
+
+
+class AuthToken(models.Model):
+    """
+    An authorization token that expires unless it is used. Every use within its lifetime
+    pushes the expiry back, writing at most once per AUTH_TOKEN_RENEW_INTERVAL.
+    """
+
+    objects = AuthTokenManager()
+    key = models.CharField(max_length=40, primary_key=True)
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="token")
+    created = models.DateTimeField(auto_now_add=True)
+    last_used = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def save(self, *args, **kwargs):
+        if not self.key:
+            self.key = self.generate_key()
+        if self.expires_at is None:
+            self.expires_at = timezone.now() + settings.AUTH_TOKEN_LIFETIME
+        return super().save(*args, **kwargs)
+
+    @classmethod
+    def generate_key(cls):
+        return binascii.hexlify(os.urandom(20)).decode()
+
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+    def __str__(self):
+        return self.key
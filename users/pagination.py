@@ -1,6 +0,0 @@
-from rest_framework.pagination import LimitOffsetPagination
-
-
-class DefaultLimitOffsetPagination(LimitOffsetPagination):
-    default_limit = 10
-    max_limit = 20
@@ -5,9 +5,9 @@ from django.contrib.auth.tokens import default_token_generator
 from django.contrib.auth.password_validation import validate_password
 
 from rest_framework import serializers
-from rest_framework.authtoken.models import Token
 
 from .utils import decode_uid
+from .models import AuthToken
 
 User = get_user_model()
 
@@ -93,7 +93,6 @@ class ChangePasswordSerializer(PasswordValidationMixin):
     current_password = serializers.CharField(max_length=128, write_only=True)
 
     def validate_current_password(self, value):
-        self.user = self.context["request"].user
         is_current_password_valid = self.user.check_password(value)
         if not is_current_password_valid:
             raise serializers.ValidationError("Invalid password.")
@@ -147,7 +146,7 @@ class TokenSerializer(serializers.ModelSerializer):
     token = serializers.CharField(source="key")
 
     class Meta:
-        model = Token
+        model = AuthToken
         fields = ["token"]
 
 
@@ -216,8 +215,7 @@ class LoginSerializer(serializers.Serializer):
         return super().validate(attrs)
 
     def get_token(self, obj):
-        (token, created) = Token.objects.get_or_create(user=self.user)
-        return token.key
+        return AuthToken.objects.issue(self.user).key
 
     def is_user_disabled(self, user):
         return (not user.is_active) and (not user.has_usable_password())
@@ -241,7 +239,8 @@ class GoogleLoginOutputSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ["id", "username", "email", "token"]
+        # Only ever renders the user who has just logged in.
+        field_dependencies = {"token": []}
 
     def get_token(self, user):
-        (token, created) = Token.objects.get_or_create(user=user)
-        return token.key
+        return AuthToken.objects.issue(user).key
@@ -1,13 +1,108 @@
+import re
+import time
+import threading
+
+import jwt
 import requests
 from attrs import define
 from random import SystemRandom
 from urllib.parse import urlencode
 from oauthlib.common import UNICODE_ASCII_CHARACTER_SET
+from requests.adapters import HTTPAdapter
 
 from django.conf import settings
+from django.core.cache import cache
 from django.urls import reverse_lazy
 from django.core.exceptions import ImproperlyConfigured, ValidationError
 
+# (connect, read) seconds, Google is never waited on for longer.
+GOOGLE_TIMEOUT = (3.05, 10)
+GOOGLE_ISSUERS = ["https://accounts.google.com", "accounts.google.com"]
+# Clock skew tolerated when checking the expiry of an id_token.
+ID_TOKEN_LEEWAY = 30
+
+
+def create_session():
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# Shared by the process, so requests to Google reuse kept-alive connections.
+session = create_session()
+
+
+class GoogleKeySet:
+    """
+    The public keys Google signs id_tokens with. They are cached for as long as Google
+    allows, in the process and in the shared cache. A token signed by a key that is not
+    cached yet makes the keys be fetched again, as Google rotates them, but at most once
+    every MIN_REFRESH_INTERVAL seconds.
+    """
+
+    DEFAULT_MAX_AGE = 3600
+    MIN_REFRESH_INTERVAL = 60
+
+    def __init__(self, url):
+        self.url = url
+        self.cache_key = f"users:google:jwks:{url}"
+        self.keys = {}
+        self.expires_at = 0.0
+        self.refreshed_at = None
+        self.lock = threading.Lock()
+
+    def get_key(self, kid):
+        with self.lock:
+            if time.monotonic() >= self.expires_at:
+                self._load(self._get_cached() or self._fetch())
+            if kid not in self.keys and self._may_refresh():
+                self._load(self._fetch())
+
+            try:
+                return self.keys[kid]
+            except KeyError:
+                raise ValidationError("Google id_token is signed by an unknown key.")
+
+    def _may_refresh(self):
+        return (
+            self.refreshed_at is None
+            or time.monotonic() - self.refreshed_at >= self.MIN_REFRESH_INTERVAL
+        )
+
+    def _get_cached(self):
+        entry = cache.get(self.cache_key)
+        if entry is None:
+            return None
+        (jwks, expires_at) = entry
+        return (jwks, expires_at - time.time())
+
+    def _fetch(self):
+        self.refreshed_at = time.monotonic()
+        try:
+            response = session.get(self.url, timeout=GOOGLE_TIMEOUT)
+        except requests.RequestException:
+            raise ValidationError("Failed to obtain signing keys from Google.")
+
+        if not response.ok:
+            raise ValidationError("Failed to obtain signing keys from Google.")
+
+        jwks = response.json()
+        max_age = re.search(r"max-age=(\d+)", response.headers.get("Cache-Control", ""))
+        max_age = int(max_age.group(1)) if max_age else self.DEFAULT_MAX_AGE
+        cache.set(self.cache_key, (jwks, time.time() + max_age), timeout=max_age)
+        return (jwks, max_age)
+
+    def _load(self, entry):
+        (jwks, max_age) = entry
+        self.keys = {
+            jwk["kid"]: jwt.PyJWK(jwk).key
+            for jwk in jwks.get("keys", [])
+            if jwk.get("use", "sig") == "sig"
+        }
+        self.expires_at = time.monotonic() + max_age
+
 
 @define
 class GoogleLoginCredentials:
@@ -26,13 +121,15 @@ class GoogleLoginService:
 
     GOOGLE_AUTH_URL = "https://accounts.google.com/o/oauth2/auth"
     GOOGLE_ACCESS_TOKEN_OBTAIN_URL = "https://oauth2.googleapis.com/token"
-    GOOGLE_USER_INFO_URL = "https://www.googleapis.com/oauth2/v3/userinfo"
+    GOOGLE_JWKS_URL = "https://www.googleapis.com/oauth2/v3/certs"
 
     SCOPES = [
         "https://www.googleapis.com/auth/userinfo.email",
         "https://www.googleapis.com/auth/userinfo.profile",
     ]
 
+    key_set = GoogleKeySet(GOOGLE_JWKS_URL)
+
     def __init__(self):
         self._credentials = get_google_login_credentials()
 
@@ -76,7 +173,12 @@ class GoogleLoginService:
             "grant_type": "authorization_code",
         }
 
-        response = requests.post(self.GOOGLE_ACCESS_TOKEN_OBTAIN_URL, data=data)
+        try:
+            response = session.post(
+                self.GOOGLE_ACCESS_TOKEN_OBTAIN_URL, data=data, timeout=GOOGLE_TIMEOUT
+            )
+        except requests.RequestException:
+            raise ValidationError("Failed to obtain access token from Google.")
 
         if not response.ok:
             raise ValidationError("Failed to obtain access token from Google.")
@@ -86,17 +188,34 @@ class GoogleLoginService:
             id_token=tokens["id_token"], access_token=tokens["access_token"]
         )
 
-    def get_user_info(self, google_tokens):
-        access_token = google_tokens.access_token
+    def verify_id_token(self, id_token):
+        """Returns the claims of an id_token once its signature and claims are checked."""
+        try:
+            header = jwt.get_unverified_header(id_token)
+            claims = jwt.decode(
+                id_token,
+                self.key_set.get_key(header.get("kid")),
+                algorithms=["RS256"],
+                audience=self._credentials.client_id,
+                leeway=ID_TOKEN_LEEWAY,
+                options={"require": ["exp", "iat", "iss", "aud", "sub"]},
+            )
+        except jwt.InvalidTokenError:
+            raise ValidationError("Invalid id_token from Google.")
+
+        if claims["iss"] not in GOOGLE_ISSUERS:
+            raise ValidationError("Invalid id_token from Google.")
+
+        return claims
 
-        response = requests.get(
-            self.GOOGLE_USER_INFO_URL, params={"access_token": access_token}
-        )
+    def get_user_info(self, google_tokens):
+        # The id_token carries the profile, which saves a round trip to the userinfo API.
+        user_info = self.verify_id_token(google_tokens.id_token)
 
-        if not response.ok:
-            raise ValidationError("Failed to obtain user info from Google.")
+        if not user_info.get("email_verified"):
+            raise ValidationError("The email of the Google account is not verified.")
 
-        return response.json()
+        return user_info
 
 
 def get_google_login_credentials():
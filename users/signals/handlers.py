@@ -0,0 +1,24 @@
+from django.dispatch import receiver
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from users.models import AuthToken
+from users.authentication import invalidate_token
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=AuthToken)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    # Logging out, changing the password and deactivating all delete the token.
+    key = instance.key
+    transaction.on_commit(lambda: invalidate_token(key))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    if created:
+        return
+
+    keys = list(AuthToken.objects.filter(user=instance).values_list("key", flat=True))
+    transaction.on_commit(lambda: [invalidate_token(key) for key in keys])
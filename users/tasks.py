@@ -0,0 +1,31 @@
+from celery import shared_task
+from celery.utils.time import get_exponential_backoff_interval
+
+from .email import EmailSendError, send_emails as _send_emails
+from .models import AuthToken
+
+EMAIL_MAX_RETRIES = 6
+EMAIL_BACKOFF_FACTOR = 5
+EMAIL_BACKOFF_MAX = 600
+
+
+@shared_task
+def purge_expired_tokens():
+    return AuthToken.objects.purge_expired()
+
+
+@shared_task(bind=True, max_retries=EMAIL_MAX_RETRIES)
+def send_emails(self, messages):
+    try:
+        return _send_emails(messages)
+    except EmailSendError as error:
+        # Only what was not sent is retried, nobody receives an email twice.
+        countdown = get_exponential_backoff_interval(
+            factor=EMAIL_BACKOFF_FACTOR,
+            retries=self.request.retries,
+            maximum=EMAIL_BACKOFF_MAX,
+            full_jitter=True,
+        )
+        raise self.retry(
+            args=[error.remaining], exc=error.__cause__, countdown=countdown
+        )
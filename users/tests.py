@@ -1,3 +1,472 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from smtplib import SMTPServerDisconnected
 
-# Create your tests here.
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from django.contrib import admin
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token, TokenProxy
+from rest_framework.test import APIClient
+
+from users.authentication import get_token_cache_key
+from users.models import AuthToken, User
+from users.services import GoogleKeySet, GoogleLoginService, GoogleTokens
+from users.tasks import purge_expired_tokens, send_emails
+
+SIZES = [1, 4, 25]
+
+
+def seed_users(size):
+    return [
+        User.objects.create_user(email=f"user{index}@scribbly.com")
+        for index in range(size)
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("size", SIZES)
+def test_query_budgets_do_not_grow_with_rows(size, assert_query_budget):
+    users = seed_users(size)
+
+    assert_query_budget(reverse("user-list"), 2)
+    assert_query_budget(reverse("user-list") + "?cursor=", 1)
+    assert_query_budget(reverse("user-list") + "?cursor=&count=true", 2)
+    assert_query_budget(reverse("user-detail", args=[users[-1].pk]), 1)
+    assert_query_budget(reverse("user-me"), 0)
+
+
+@pytest.fixture
+def token(db):
+    user = User.objects.create_user(
+        email="user@scribbly.com", password="Pass-1234", is_active=True
+    )
+    return AuthToken.objects.create(user=user)
+
+
+@pytest.fixture
+def token_client(token):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+    return client
+
+
+def test_warm_token_authenticates_without_queries(token_client):
+    with CaptureQueriesContext(connection) as context:
+        assert token_client.get(reverse("user-me")).status_code == 200
+    assert len(context) == 1
+
+    with CaptureQueriesContext(connection) as context:
+        response = token_client.get(reverse("user-me"))
+    assert response.status_code == 200
+    assert response.data["email"] == "user@scribbly.com"
+    assert len(context) == 0
+
+
+def test_logout_invalidates_cached_token(
+    token_client, django_capture_on_commit_callbacks
+):
+    assert token_client.get(reverse("user-me")).status_code == 200
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = token_client.delete(reverse("logout"))
+    assert response.status_code == 204
+
+    assert token_client.get(reverse("user-me")).status_code == 401
+
+
+def test_change_password_invalidates_cached_token(
+    token_client, django_capture_on_commit_callbacks
+):
+    assert token_client.get(reverse("user-me")).status_code == 200
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = token_client.post(
+            reverse("user-change-password"),
+            {"current_password": "Pass-1234", "new_password": "Other-pass-5678"},
+        )
+    assert response.status_code == 200
+
+    assert token_client.get(reverse("user-me")).status_code == 401
+    token_client.credentials(HTTP_AUTHORIZATION=f"Token {response.data['token']}")
+    assert token_client.get(reverse("user-me")).status_code == 200
+
+
+def test_saving_the_user_invalidates_cached_token(
+    token, token_client, django_capture_on_commit_callbacks
+):
+    assert token_client.get(reverse("user-me")).status_code == 200
+
+    with django_capture_on_commit_callbacks(execute=True):
+        token.user.is_active = False
+        token.user.save(update_fields=["is_active"])
+
+    assert token_client.get(reverse("user-me")).status_code == 401
+
+
+def test_expired_token_is_rejected(token, token_client):
+    AuthToken.objects.filter(pk=token.pk).update(expires_at=timezone.now())
+
+    response = token_client.get(reverse("user-me"))
+    assert response.status_code == 401
+    assert response.data["detail"] == "Token has expired."
+
+
+def test_token_is_renewed_at_most_once_per_interval(token, token_client, settings):
+    settings.AUTH_TOKEN_RENEW_INTERVAL = timedelta(minutes=5)
+    used_at = timezone.now() - timedelta(minutes=10)
+    AuthToken.objects.filter(pk=token.pk).update(last_used=used_at)
+
+    assert token_client.get(reverse("user-me")).status_code == 200
+    token.refresh_from_db()
+    assert token.last_used > used_at
+    assert token.expires_at > timezone.now() + timedelta(days=29)
+
+    # Within the interval the renewal is neither written nor looked up again.
+    renewed = (token.last_used, token.expires_at)
+    with CaptureQueriesContext(connection) as context:
+        assert token_client.get(reverse("user-me")).status_code == 200
+    assert len(context) == 0
+    token.refresh_from_db()
+    assert (token.last_used, token.expires_at) == renewed
+
+
+@pytest.mark.django_db
+def test_issue_replaces_an_expired_token():
+    user = User.objects.create_user(email="user@scribbly.com")
+    token = AuthToken.objects.issue(user)
+    assert AuthToken.objects.issue(user) == token
+
+    AuthToken.objects.filter(pk=token.pk).update(expires_at=timezone.now())
+    renewed = AuthToken.objects.issue(user)
+    assert renewed != token
+    assert not renewed.is_expired()
+
+
+@pytest.mark.django_db
+def test_purge_deletes_only_expired_tokens_in_batches():
+    tokens = [AuthToken.objects.create(user=user) for user in seed_users(5)]
+    expired = [token.pk for token in tokens[:3]]
+    AuthToken.objects.filter(pk__in=expired).update(expires_at=timezone.now())
+
+    assert AuthToken.objects.purge_expired(batch_size=2) == 3
+    assert set(AuthToken.objects.values_list("pk", flat=True)) == {
+        token.pk for token in tokens[3:]
+    }
+
+    AuthToken.objects.update(expires_at=timezone.now())
+    assert purge_expired_tokens.delay().get() == 2
+    assert not AuthToken.objects.exists()
+
+
+class FlakyEmailBackend(EmailBackend):
+    """Counts the connections opened and drops the connection before the nth email."""
+
+    opened = 0
+    fail_at = None
+    refused_opens = 0
+
+    def open(self):
+        if FlakyEmailBackend.refused_opens:
+            FlakyEmailBackend.refused_opens -= 1
+            raise ConnectionRefusedError("Connection refused")
+        FlakyEmailBackend.opened += 1
+
+    def send_messages(self, messages):
+        if len(mail.outbox) + 1 == FlakyEmailBackend.fail_at:
+            FlakyEmailBackend.fail_at = None
+            raise SMTPServerDisconnected("Connection unexpectedly closed")
+        return super().send_messages(messages)
+
+
+@pytest.fixture
+def flaky_backend(settings):
+    settings.EMAIL_BACKEND = "users.tests.FlakyEmailBackend"
+    FlakyEmailBackend.opened = 0
+    FlakyEmailBackend.fail_at = None
+    FlakyEmailBackend.refused_opens = 0
+    return FlakyEmailBackend
+
+
+def get_activation_messages(size):
+    return [
+        {
+            "name": "activation",
+            "to": [f"user{index}@scribbly.com"],
+            "context": {"username": f"user{index}", "code": str(index)},
+        }
+        for index in range(size)
+    ]
+
+
+def test_reset_password_email_is_sent_by_a_worker(token, settings):
+    settings.RESET_PASSWORD_CONFIRM_URL = "https://scribbly.com/reset"
+
+    response = APIClient().post(
+        reverse("user-reset-password"), {"email": "user@scribbly.com"}
+    )
+
+    assert response.status_code == 204
+    (email,) = mail.outbox
+    assert email.to == ["user@scribbly.com"]
+    assert "https://scribbly.com/reset?uid=" in email.body
+
+
+def test_activation_email_is_sent_by_a_worker(db):
+    User.objects.create_user(email="user@scribbly.com", password="Pass-1234")
+
+    response = APIClient().post(
+        reverse("user-resend-activation"), {"email": "user@scribbly.com"}
+    )
+
+    assert response.status_code == 204
+    (email,) = mail.outbox
+    assert email.to == ["user@scribbly.com"]
+    assert cache.get("user@scribbly.com") in email.body
+
+
+def test_emails_reuse_the_connection(flaky_backend):
+    send_emails.delay(get_activation_messages(3))
+    send_emails.delay(get_activation_messages(2))
+
+    assert len(mail.outbox) == 5
+    assert flaky_backend.opened == 1
+
+
+def test_failed_emails_are_retried_without_resending(flaky_backend):
+    flaky_backend.fail_at = 3
+
+    send_emails.delay(get_activation_messages(5))
+
+    assert [email.to for email in mail.outbox] == [
+        [f"user{index}@scribbly.com"] for index in range(5)
+    ]
+    # The dropped connection is replaced before the retry.
+    assert flaky_backend.opened == 2
+
+
+def test_emails_are_retried_when_the_connection_cannot_be_opened(flaky_backend):
+    flaky_backend.refused_opens = 2
+
+    send_emails.delay(get_activation_messages(2))
+
+    assert len(mail.outbox) == 2
+    assert flaky_backend.opened == 1
+
+
+class StubGoogle(ThreadingHTTPServer):
+    """Answers the token and JWKS endpoints of Google with tokens it signs itself."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubGoogleHandler)
+        self.url = f"http://127.0.0.1:{self.server_address[1]}"
+        self.requests = []
+        self.connections = 0
+        self.delay = 0
+        self.claims = {}
+        self.rotate()
+
+    def rotate(self):
+        self.private_key = rsa.generate_private_key(
+            public_exponent=65537, key_size=2048
+        )
+        self.kid = f"key-{time.monotonic_ns()}"
+
+    def get_jwks(self):
+        jwk = json.loads(
+            jwt.algorithms.RSAAlgorithm.to_jwk(self.private_key.public_key())
+        )
+        return {"keys": [{**jwk, "kid": self.kid, "use": "sig", "alg": "RS256"}]}
+
+    def get_id_token(self):
+        now = int(time.time())
+        claims = {
+            "iss": "https://accounts.google.com",
+            "aud": "client-id",
+            "sub": "1234",
+            "email": "google@scribbly.com",
+            "email_verified": True,
+            "iat": now,
+            "exp": now + 3600,
+            **self.claims,
+        }
+        return jwt.encode(
+            claims, self.private_key, algorithm="RS256", headers={"kid": self.kid}
+        )
+
+
+class StubGoogleHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        self.respond(self.server.get_jwks(), {"Cache-Control": "public, max-age=600"})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests.append(self.path)
+        time.sleep(self.server.delay)
+        self.respond(
+            {"id_token": self.server.get_id_token(), "access_token": "access-token"}
+        )
+
+    def respond(self, data, headers=None):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_google(settings, monkeypatch):
+    settings.GOOGLE_OAUTH2_CLIENT_ID = "client-id"
+    settings.GOOGLE_OAUTH2_CLIENT_SECRET = "client-secret"
+    settings.BASE_BACKEND_URL = "http://testserver"
+
+    server = StubGoogle()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    monkeypatch.setattr(
+        GoogleLoginService, "GOOGLE_ACCESS_TOKEN_OBTAIN_URL", f"{server.url}/token"
+    )
+    monkeypatch.setattr(
+        GoogleLoginService, "key_set", GoogleKeySet(f"{server.url}/certs")
+    )
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def google_login(client, state="state"):
+    session = client.session
+    session["google_oauth2_state"] = state
+    session.save()
+    return client.get(reverse("google-callback"), {"code": "code", "state": state})
+
+
+def test_google_login_verifies_the_id_token_locally(db, stub_google):
+    client = APIClient()
+
+    response = google_login(client)
+    assert response.status_code == 201
+    assert User.objects.get(email="google@scribbly.com").is_active
+    assert AuthToken.objects.get(key=response.data["token"])
+
+    assert google_login(client).status_code == 200
+    # The keys are fetched once and both logins share a kept-alive connection.
+    assert stub_google.requests == ["/token", "/certs", "/token"]
+    assert stub_google.connections == 1
+
+
+def test_rotated_google_keys_are_fetched_again(db, stub_google):
+    service = GoogleLoginService()
+    service.key_set.MIN_REFRESH_INTERVAL = 0
+    tokens = service.get_google_tokens(code="code")
+    assert service.get_user_info(tokens)["email"] == "google@scribbly.com"
+
+    stub_google.rotate()
+    tokens = service.get_google_tokens(code="code")
+    assert service.get_user_info(tokens)["email"] == "google@scribbly.com"
+    assert stub_google.requests == ["/token", "/certs", "/token", "/certs"]
+
+    # Unknown keys right after a refresh are rejected without fetching again.
+    service.key_set.MIN_REFRESH_INTERVAL = 60
+    stub_google.rotate()
+    tokens = service.get_google_tokens(code="code")
+    with pytest.raises(ValidationError):
+        service.get_user_info(tokens)
+    assert stub_google.requests.count("/certs") == 2
+
+
+@pytest.mark.parametrize(
+    "claims",
+    [
+        {"aud": "other-client-id"},
+        {"iss": "https://accounts.example.com"},
+        {"exp": int(time.time()) - 3600},
+        {"email_verified": False},
+    ],
+)
+def test_invalid_id_tokens_are_rejected(db, stub_google, claims):
+    stub_google.claims = claims
+    service = GoogleLoginService()
+
+    with pytest.raises(ValidationError):
+        service.get_user_info(service.get_google_tokens(code="code"))
+
+
+def test_forged_id_token_is_rejected(db, stub_google):
+    service = GoogleLoginService()
+    tokens = service.get_google_tokens(code="code")
+    forged = jwt.encode(
+        jwt.decode(tokens.id_token, options={"verify_signature": False}),
+        rsa.generate_private_key(public_exponent=65537, key_size=2048),
+        algorithm="RS256",
+        headers={"kid": stub_google.kid},
+    )
+
+    with pytest.raises(ValidationError):
+        service.get_user_info(GoogleTokens(id_token=forged, access_token=""))
+
+
+def test_google_requests_time_out(db, stub_google, monkeypatch):
+    monkeypatch.setattr("users.services.GOOGLE_TIMEOUT", (1, 0.1))
+    stub_google.delay = 0.5
+
+    with pytest.raises(ValidationError):
+        GoogleLoginService().get_google_tokens(code="code")
+
+
+def test_cached_token_entries_leave_out_the_password(
+    token, token_client, django_capture_on_commit_callbacks
+):
+    assert token_client.get(reverse("user-me")).status_code == 200
+    entry = cache.get(get_token_cache_key(token.key))
+    assert entry["user"]["email"] == "user@scribbly.com"
+    assert "password" not in entry["user"]
+
+    url = reverse("user-change-password")
+    response = token_client.post(
+        url, {"current_password": "Wrong-1234", "new_password": "Other-pass-5678"}
+    )
+    assert response.status_code == 400
+    assert "current_password" in response.data
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = token_client.post(
+            url, {"current_password": "Pass-1234", "new_password": "Other-pass-5678"}
+        )
+    assert response.status_code == 200
+    token.user.refresh_from_db()
+    assert token.user.check_password("Other-pass-5678")
+
+
+def test_legacy_tokens_are_not_managed_in_the_admin():
+    assert not admin.site.is_registered(TokenProxy)
+    assert not admin.site.is_registered(Token)
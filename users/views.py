@@ -7,9 +7,13 @@ from django.contrib.auth import get_user_model
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
-from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from rest_framework.permissions import (
+    SAFE_METHODS,
+    IsAuthenticated,
+    AllowAny,
+    IsAdminUser,
+)
 from rest_framework.decorators import action
-from rest_framework.authtoken.models import Token
 from rest_framework.generics import GenericAPIView
 from rest_framework.views import APIView
 
@@ -29,20 +33,24 @@ from .serializers import (
     GoogleAuthSerializer,
     GoogleLoginOutputSerializer,
 )
-from .pagination import DefaultLimitOffsetPagination
-from .email import PasswordResetEmail, ActivationEmail
+from blog.pagination import OptInKeysetPagination
+from blog.planning import QueryPlanMixin
+from .email import get_message
+from .tasks import send_emails
 from .utils import generate_random_code
 from .constants import CacheTimeouts
 from .services import GoogleLoginService
+from .models import AuthToken
 
 User = get_user_model()
 
 
-class UserViewSet(ModelViewSet):
+class UserViewSet(QueryPlanMixin, ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = DefaultLimitOffsetPagination
+    pagination_class = OptInKeysetPagination
+    cursor_ordering = ("-date_joined", "-id")
 
     @action(methods=["GET", "PUT", "PATCH"], detail=False)
     def me(self, request, *args, **kwargs):
@@ -59,15 +67,16 @@ class UserViewSet(ModelViewSet):
     def change_password(self, request, *args, **kwargs):
         user = self.get_current_user()
         serializer = self.get_serializer(data=request.data)
+        serializer.user = user
         serializer.is_valid(raise_exception=True)
 
         user.set_password(serializer.validated_data["new_password"])
         user.save(update_fields=["password"])
 
         # Log out user from other systems
-        Token.objects.filter(user=user).delete()
+        AuthToken.objects.filter(user=user).delete()
 
-        new_token = Token.objects.create(user=user)
+        new_token = AuthToken.objects.create(user=user)
         serializer = TokenSerializer(new_token)
 
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -78,9 +87,8 @@ class UserViewSet(ModelViewSet):
         serializer.is_valid(raise_exception=True)
 
         user = serializer.user
-        context = {"user": user}
-
-        PasswordResetEmail(request, context).send(to=[user.email])
+        message = get_message(request, "reset_password", [user.email], user_id=user.pk)
+        send_emails.delay([message])
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -106,8 +114,10 @@ class UserViewSet(ModelViewSet):
         code = generate_random_code()
         cache.set(key=user.email, value=code, timeout=CacheTimeouts.WEEK)
 
-        context = {"username": user.username, "code": code}
-        ActivationEmail(request, context).send(to=[user.email])
+        message = get_message(
+            request, "activation", [user.email], username=user.username, code=code
+        )
+        send_emails.delay([message])
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -124,7 +134,7 @@ class UserViewSet(ModelViewSet):
 
         cache.delete(key=email)
 
-        token = Token.objects.create(user=user)
+        token = AuthToken.objects.issue(user)
         serializer = TokenSerializer(token)
 
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -142,7 +152,7 @@ class UserViewSet(ModelViewSet):
         user.set_unusable_password()
         user.save(update_fields=["is_active", "password"])
 
-        Token.objects.filter(user=user).delete()
+        AuthToken.objects.filter(user=user).delete()
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -160,7 +170,10 @@ class UserViewSet(ModelViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     def get_current_user(self):
-        return self.request.user
+        if self.request.method in SAFE_METHODS:
+            return self.request.user
+        # The authenticated user may be a cached snapshot, writes start from the row.
+        return User.objects.get(pk=self.request.user.pk)
 
     def get_queryset(self):
         user = self.request.user
@@ -220,7 +233,7 @@ class LogoutView(GenericAPIView):
     permission_classes = [IsAuthenticated]
 
     def delete(self, request):
-        Token.objects.filter(user=request.user).delete()
+        AuthToken.objects.filter(user=request.user).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 